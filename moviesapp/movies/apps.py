@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class MoviesConfig(AppConfig):
     name = 'movies'
+
+    def ready(self):
+        # Register signal handlers
+        from movies import signals
+        post_migrate.connect(signals.create_search_index, sender=self)
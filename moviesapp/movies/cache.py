@@ -0,0 +1,161 @@
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+# Hit and miss counters of cached data, exposed by StatsView
+STATS = ('top', 'omdb', 'omdb_negative', 'count', 'facets', 'responses')
+
+
+def incr(key, delta=1):
+    # Counters are never expired, but they can be evicted by cache backend
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+# Generation which isn't cached (never set or evicted by cache backend)
+# starts from current time in microseconds - it's greater than every
+# generation used before, so data cached under them is never used again
+def new_generation():
+    return int(time.time() * 1000000)
+
+
+def get_generation(namespace):
+    return cache.get_or_set(
+        'generation:' + namespace, new_generation, timeout=None)
+
+
+# Bump generation of data in namespace, every key built with old generation
+# is no longer used and it will be removed by cache backend
+def bump_generation(namespace):
+    key = 'generation:' + namespace
+    cache.add(key, new_generation(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = new_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def record(namespace, hit):
+    incr('stats:{}:{}'.format(namespace, 'hits' if hit else 'misses'))
+
+
+# Value cached under key which contains generation of namespace, it is
+# computed by function only if it isn't cached
+def get_or_compute(namespace, key, compute, timeout=None):
+    key = '{}:{}:{}'.format(namespace, get_generation(namespace), key)
+    value = cache.get(key)
+    record(namespace, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+# Data of response cached under key which contains generation of namespace,
+# only successful responses are cached. Data is cached before rendering, so
+# it is shared by all formats (JSON, browsable API).
+def get_or_respond(namespace, key, respond, timeout=None):
+    key = '{}:{}:{}'.format(namespace, get_generation(namespace), key)
+    data = cache.get(key)
+    record(namespace, data is not None)
+    if data is not None:
+        return Response(data)
+    response = respond()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, timeout)
+    return response
+
+
+# Number of all rows of queryset's table, cached until rows are added or
+# removed (see movies.signals)
+def get_row_count(queryset, timeout=None):
+    table = queryset.model._meta.db_table
+    key = 'count:{}:{}'.format(get_generation('count:' + table), table)
+    count = cache.get(key)
+    record('count', count is not None)
+    if count is None:
+        count = queryset.order_by().values('pk').count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def get_stats():
+    keys = [
+        'stats:{}:{}'.format(namespace, counter)
+        for namespace in STATS for counter in ('hits', 'misses')
+    ]
+    values = cache.get_many(keys)
+    return {
+        namespace: {
+            counter: values.get('stats:{}:{}'.format(namespace, counter), 0)
+            for counter in ('hits', 'misses')
+        }
+        for namespace in STATS
+    }
+
+
+# Rows of queryset cached under key which contains generation of namespace,
+# slices and chunks of iteration over all rows are cached separately
+class CachedRows:
+    # Rows of one cached chunk of iteration
+    chunk_size = 1000
+
+    def __init__(self, queryset, namespace, key, timeout=None):
+        self.queryset = queryset
+        self.namespace = namespace
+        self.key = '{}:{}:{}'.format(
+            namespace, get_generation(namespace), key)
+        self.timeout = timeout
+
+    def get(self, key):
+        rows = cache.get(key)
+        record(self.namespace, rows is not None)
+        return rows
+
+    def get_key(self, start, stop):
+        return '{}:{}:{}'.format(self.key, start, stop)
+
+    def __getitem__(self, item):
+        key = self.get_key(item.start, item.stop)
+        rows = self.get(key)
+        if rows is None:
+            rows = list(self.queryset[item])
+            cache.set(key, rows, self.timeout)
+        return rows
+
+    # Rows are read from cached chunks, so neither memory nor a single cache
+    # entry grows with the number of rows. Rows after the first chunk which
+    # isn't cached are streamed by one query.
+    def iterator(self):
+        start = 0
+        while True:
+            rows = self.get(self.get_key(start, start + self.chunk_size))
+            if rows is None:
+                yield from self.fetch(start)
+                return
+            yield from rows
+            if len(rows) < self.chunk_size:
+                return
+            start += self.chunk_size
+
+    # Rows from offset, every chunk is cached when all its rows are fetched
+    def fetch(self, start):
+        rows = []
+        for row in self.queryset[start:].iterator():
+            rows.append(row)
+            yield row
+            if len(rows) == self.chunk_size:
+                cache.set(self.get_key(start, start + self.chunk_size), rows,
+                          self.timeout)
+                start += self.chunk_size
+                rows = []
+        cache.set(self.get_key(start, start + self.chunk_size), rows,
+                  self.timeout)
@@ -0,0 +1,64 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+from django.db.models.functions import Floor
+
+# Facets of movies and types of their values, values are stored as text
+FACETS = (
+    ('genre', str),
+    ('year', int),
+    ('decade', int),
+    ('rating', int),
+)
+
+
+# Number of movies for every facet value, computed with one grouped query
+# per facet. Links are rows of movies and genres relation.
+def count(movies, links):
+    movies = movies.order_by()
+    queries = {
+        'genre': links.filter(movie__in=movies.values('pk')).order_by(
+        ).values(value=F('genre__name')),
+        'year': movies.values(value=F('Year')),
+        'decade': movies.annotate(
+            value=F('Year') / 10 * 10).values('value'),
+        'rating': movies.annotate(
+            value=Floor('imdb_rating')).values('value'),
+    }
+    counts = defaultdict(Counter)
+    for facet, query in queries.items():
+        for row in query.annotate(total=Count('pk')):
+            value = '' if row['value'] is None else str(row['value'])
+            if facet in ('rating', 'year', 'decade') and value:
+                value = str(int(float(value)))
+            counts[facet][value] += row['total']
+    return counts
+
+
+# Replace stored counts of all movies
+def rebuild(FacetCount, movies, links):
+    FacetCount.objects.all().delete()
+    FacetCount.objects.bulk_create(
+        (FacetCount(facet=facet, value=value, count=total)
+         for facet, values in count(movies, links).items()
+         for value, total in values.items()),
+        batch_size=1000,
+    )
+
+
+# Facets in response - genres from the most common, other facets ordered
+# by value, empty bucket (e.g. movies without rating) is the last one
+def serialize(counts):
+    data = {}
+    for facet, value_type in FACETS:
+        rows = [
+            {'value': value_type(value) if value else None, 'count': total}
+            for value, total in counts.get(facet, {}).items() if total > 0
+        ]
+        if facet == 'genre':
+            rows.sort(key=lambda row: (-row['count'], row['value']))
+        else:
+            rows.sort(key=lambda row: (row['value'] is None,
+                                       row['value'] or 0))
+        data[facet] = rows
+    return data
@@ -0,0 +1,103 @@
+from django import forms
+from django.db.models import Count, F
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from movies import search
+from movies.models import Movie
+
+# Typed fields of movies filtered and ordered with names of OMDb fields,
+# e.g. ?imdbRating__gte=8&ordering=-imdbVotes
+TYPED_ALIASES = {
+    typed_field: field
+    for field, (typed_field, _) in Movie.TYPED_FIELDS.items()
+}
+
+
+# Any number of values of the parameter, e.g. ?genre=Drama&genre=Action
+class MultipleValueField(forms.MultipleChoiceField):
+
+    def valid_value(self, value):
+        return True
+
+
+class MultipleCharFilter(filters.MultipleChoiceFilter):
+    field_class = MultipleValueField
+
+
+# Movies are filtered by exact names of genres - with all of them by default,
+# or any of them with ?genre_match=any
+class MovieFilterSet(filters.FilterSet):
+    genre = MultipleCharFilter(method='filter_genre')
+    genre_match = filters.ChoiceFilter(
+        choices=(('all', 'all'), ('any', 'any')), method='filter_noop')
+
+    class Meta:
+        model = Movie
+        fields = {
+            'Title': ('icontains', ),
+            'Year': ('exact', 'gt', 'lte'),
+            'Genre': ('icontains', ),
+        }
+        fields.update({
+            typed_field: ('exact', 'gt', 'gte', 'lt', 'lte')
+            for typed_field in TYPED_ALIASES
+        })
+
+    @classmethod
+    def get_filters(cls):
+        filters = super().get_filters()
+        for name in list(filters):
+            field, separator, lookup = name.partition('__')
+            if field in TYPED_ALIASES:
+                alias = TYPED_ALIASES[field] + separator + lookup
+                filters[alias] = filters.pop(name)
+        return filters
+
+    def filter_genre(self, queryset, name, value):
+        links = Movie.genres.through.objects.filter(genre__name__in=value)
+        if self.form.cleaned_data.get('genre_match') != 'any':
+            links = links.values('movie').annotate(
+                matched=Count('genre')).filter(matched=len(set(value)))
+        return queryset.filter(pk__in=links.values('movie'))
+
+    # Parameter used by other filter
+    def filter_noop(self, queryset, name, value):
+        return queryset
+
+
+# Full-text search of movies (?search=) over title, actors, director, genre
+# and plot
+class MovieSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        return search.search(queryset, text)
+
+
+# Searched movies are ordered by relevance unless ordering is requested.
+# Typed fields are ordered by their OMDb names (view.ordering_aliases) and
+# movies without value ("N/A") are always placed at the end.
+class RankedOrderingFilter(OrderingFilter):
+
+    def get_ordering(self, request, queryset, view):
+        if (not request.query_params.get(self.ordering_param) and
+                'search_rank' in queryset.query.annotations):
+            return ('-search_rank', 'pk')
+        ordering = super().get_ordering(request, queryset, view)
+        aliases = getattr(view, 'ordering_aliases', {})
+        if not ordering:
+            return ordering
+        return [self.resolve_alias(term, aliases) for term in ordering]
+
+    @staticmethod
+    def resolve_alias(term, aliases):
+        if not isinstance(term, str) or term.lstrip('-') not in aliases:
+            return term
+        field = F(aliases[term.lstrip('-')])
+        if term.startswith('-'):
+            return field.desc(nulls_last=True)
+        return field.asc(nulls_last=True)
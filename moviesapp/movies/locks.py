@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from movies.models import ImportLock
+from moviesapp.settings import IMPORT_LOCK_TIMEOUT
+
+
+# Table of locks created on demand for every key and removed when no thread
+# uses them anymore
+class KeyedLock:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def __call__(self, key):
+        with self._lock:
+            # [lock, number of threads holding or waiting for the lock]
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+    def __len__(self):
+        return len(self._locks)
+
+
+_import_locks = KeyedLock()
+
+# Delay between checks of import lock held by other process, in seconds
+POLL_INTERVAL = 0.1
+
+
+# Import lock of a key - held by the current request, or released by other
+# request with outcome of the import
+class ImportLease:
+
+    def __init__(self, lock=None, outcome=None):
+        self.lock = lock
+        self.outcome = outcome
+        self.result = None
+
+    # Outcome of the import (imdbID, '' if the movie hasn't been found), it is
+    # read by requests which have been waiting for the lock
+    def record(self, result):
+        self.result = result
+
+
+# Lock row is created with a lease, so no DB transaction is kept open while
+# the movie is imported. Expired row (e.g. of crashed process) is removed
+# and the lock is taken over.
+def acquire(digest):
+    while True:
+        now = timezone.now()
+        ImportLock.objects.filter(key=digest, expires__lte=now).delete()
+        try:
+            with transaction.atomic():
+                lock = ImportLock.objects.create(
+                    key=digest,
+                    expires=now + timedelta(seconds=IMPORT_LOCK_TIMEOUT))
+            return ImportLease(lock=lock)
+        except IntegrityError:
+            pass
+        outcome = ImportLock.objects.filter(key=digest).values_list(
+            'result', flat=True).first()
+        if outcome is not None:
+            return ImportLease(outcome=outcome)
+        time.sleep(POLL_INTERVAL)
+
+
+# Outcome is kept until the row expires, lock without outcome is removed at
+# once, as well as expired rows of other keys
+def release(lease):
+    now = timezone.now()
+    locks = ImportLock.objects.filter(pk=lease.lock.pk)
+    if lease.result is None:
+        locks.delete()
+    else:
+        locks.update(result=lease.result,
+                     expires=now + timedelta(seconds=IMPORT_LOCK_TIMEOUT))
+    ImportLock.objects.filter(expires__lte=now).delete()
+
+
+# Threads of the process wait for in-process lock, so only one of them per
+# key polls the lock held by other processes
+@contextmanager
+def import_lock(key):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    with _import_locks(key):
+        lease = acquire(digest)
+        try:
+            yield lease
+        except Exception:
+            # Failed import has no outcome, the lock is removed at once
+            lease.record(None)
+            raise
+        finally:
+            if lease.lock is not None:
+                release(lease)
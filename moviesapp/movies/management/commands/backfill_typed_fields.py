@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from movies import facets, signals
+from movies.models import FacetCount, Movie
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill typed columns (imdb_rating, imdb_votes, meta_score, '
+        'runtime_minutes, box_office, released_date) from OMDb text fields '
+        'of existing movies.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of movies updated with one query.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(Movie.TYPED_FIELDS)
+        # bulk_update() doesn't set auto_now fields, time of the change is
+        # set here, so validators of conditional requests change
+        typed_fields = [
+            field for field, _ in Movie.TYPED_FIELDS.values()] + ['updated']
+        updated = 0
+        last_pk = 0
+        # Movies are read in batches by primary key, so memory usage and
+        # duration of each transaction don't grow with number of movies
+        while True:
+            batch = list(Movie.objects.filter(pk__gt=last_pk).order_by(
+                'pk').only('pk', *fields)[:batch_size])
+            if not batch:
+                break
+            now = timezone.now()
+            for movie in batch:
+                movie.set_typed_fields()
+                movie.updated = now
+            with transaction.atomic():
+                Movie.objects.bulk_update(batch, typed_fields)
+            updated += len(batch)
+            last_pk = batch[-1].pk
+        # Rating buckets of facets are counted from typed ratings. Signals
+        # aren't sent by bulk_update(), so cached facets and responses (typed
+        # filters and ordering) are invalidated here.
+        with transaction.atomic():
+            facets.rebuild(FacetCount, Movie.objects.all(),
+                           Movie.genres.through.objects.all())
+            signals.invalidate('facets')
+            signals.invalidate('responses')
+        self.stdout.write(self.style.SUCCESS(
+            'Typed fields of {} movies have been filled.'.format(updated)))
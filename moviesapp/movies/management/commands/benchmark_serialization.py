@@ -0,0 +1,118 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from movies import views
+from movies.models import Comment, Movie, Rating
+from movies.renderers import FastJSONRenderer
+
+# Cache of the benchmark's process, it is cleared before every run
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark_serialization',
+    },
+}
+
+
+# Sample movies with ratings and comments, saved with bulk_create()
+def create_sample(movies):
+    Movie.objects.bulk_create(
+        (Movie(
+            Title='Sample movie {}'.format(number), Year=1950 + number % 70,
+            imdbID='sample{}'.format(number), Genre='Drama, Comedy',
+            Plot='A sample plot of the movie number {}.'.format(number) * 5,
+            Actors='Actor One, Actor Two, Actor Three',
+            imdbRating='{:.1f}'.format(number % 100 / 10),
+        ) for number in range(movies)),
+        batch_size=500,
+    )
+    pks = list(Movie.objects.filter(imdbID__startswith='sample').values_list(
+        'pk', flat=True))
+    sources = ('Internet Movie Database', 'Metacritic')
+    Rating.objects.bulk_create(
+        (Rating(Movie_id=pk, Source=source, Value='7/10')
+         for pk in pks for source in sources),
+        batch_size=500,
+    )
+    Comment.objects.bulk_create(
+        (Comment(movie_id=pk, user='user{}'.format(number % 10),
+                 comment='Sample comment.')
+         for pk in pks for number in range(3)),
+        batch_size=500,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare duration of list endpoints (movies, comments, top) '
+        'serialized by serializers with JSONRenderer and by the fast path '
+        'with orjson.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Number of requests to every endpoint in each mode.',
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=100,
+            help='Number of movies and comments in page of the list.',
+        )
+        parser.add_argument(
+            '--sample', type=int, default=0,
+            help='Number of sample movies created for the benchmark and '
+                 'removed after it (by default existing movies are used).',
+        )
+
+    @staticmethod
+    def measure(view, params, fast, requests):
+        renderers = (FastJSONRenderer, ) if fast else (JSONRenderer, )
+        factory = APIRequestFactory()
+        with mock.patch.object(view, 'fast_serialization', fast), \
+                mock.patch.object(view, 'renderer_classes', renderers):
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = view.as_view()(factory.get('/', params))
+                if response.streaming:
+                    content = b''.join(response.streaming_content)
+                else:
+                    content = response.render().content
+            return (time.perf_counter() - start) / requests, content
+
+    def handle(self, *args, **options):
+        endpoints = (
+            ('movies', views.MoviesList, {'page_size': options['page_size']}),
+            ('comments', views.CommentsList,
+             {'page_size': options['page_size']}),
+            ('top', views.TopList, {}),
+        )
+        # Requests are built by APIRequestFactory for host 'testserver'.
+        # Caches are filled with rows rolled back below, so a cache of this
+        # process is used instead of the configured (possibly shared) one.
+        with override_settings(ALLOWED_HOSTS=['testserver'],
+                               CACHES=BENCHMARK_CACHES), \
+                transaction.atomic():
+            cache.clear()
+            if options['sample']:
+                create_sample(options['sample'])
+            for name, view, params in endpoints:
+                # The first request fills caches (counts, ranking)
+                self.measure(view, params, True, 1)
+                slow, slow_content = self.measure(
+                    view, params, False, options['requests'])
+                fast, fast_content = self.measure(
+                    view, params, True, options['requests'])
+                self.stdout.write(
+                    '{:<10} serializers {:8.2f} ms  fast {:8.2f} ms  '
+                    'speedup {:5.2f}x  same output: {}'.format(
+                        name, slow * 1000, fast * 1000, slow / fast,
+                        slow_content == fast_content))
+            # Sample movies are removed
+            transaction.set_rollback(True)
@@ -0,0 +1,155 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movies.models import Movie, Rating
+from movies.serializers import MovieSerializerSave
+from movies.signals import post_bulk_create
+
+
+# Yield objects of JSON array one by one, without reading whole file
+def iter_json_array(fp, buffer_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise ValueError('File doesn\'t contain JSON array.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if started and buffer.startswith(']'):
+            return
+        if started and buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except ValueError:
+                # Object is split between chunks of the file
+                if eof:
+                    raise
+            else:
+                yield obj
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise ValueError('Unexpected end of JSON array.')
+        chunk = fp.read(buffer_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def iter_json_lines(fp):
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import movies from file with OMDb responses - JSON array or JSON '
+        'lines. Movies with imdbID already saved in DB are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the file with OMDb data.')
+        parser.add_argument(
+            '--format', choices=('json', 'jsonl'),
+            help='Format of the file, by default detected from extension.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Number of movies saved in one transaction.',
+        )
+
+    @staticmethod
+    def validate(records, stats):
+        for record in records:
+            stats['read'] += 1
+            if (not isinstance(record, dict) or
+                    record.get('Response') != 'True'):
+                stats['invalid'] += 1
+                continue
+            serializer = MovieSerializerSave(data=record)
+            if serializer.is_valid():
+                yield serializer.validated_data
+            else:
+                stats['invalid'] += 1
+
+    @staticmethod
+    def save_chunk(chunk, stats):
+        existing = set(Movie.objects.filter(
+            imdbID__in=[data['imdbID'] for data in chunk],
+        ).values_list('imdbID', flat=True))
+        new = {}
+        for data in chunk:
+            if data['imdbID'] in existing or data['imdbID'] in new:
+                stats['skipped'] += 1
+            else:
+                new[data['imdbID']] = data
+
+        movies = [
+            Movie(**{field: value for field, value in data.items()
+                     if field != 'Ratings'})
+            for data in new.values()
+        ]
+        for movie in movies:
+            movie.set_typed_fields()
+        with transaction.atomic():
+            movies = Movie.objects.bulk_create(movies)
+            # Primary keys aren't returned by bulk_create() on every database
+            pks = dict(Movie.objects.filter(imdbID__in=new).values_list(
+                'imdbID', 'pk'))
+            Rating.objects.bulk_create(
+                Rating(Movie_id=pks[imdb_id], **rating)
+                for imdb_id, data in new.items()
+                for rating in data['Ratings']
+            )
+            for movie in movies:
+                movie.pk = pks[movie.imdbID]
+            # Sent in the same transaction, so facets and genres are saved
+            # together with movies, caches are invalidated again on commit
+            post_bulk_create.send(sender=Movie, objects=movies)
+        stats['imported'] += len(movies)
+
+    def report(self, stats, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            'Read {read}, imported {imported}, skipped {skipped}, invalid '
+            '{invalid} records - {rate:.0f} records/s.'.format(
+                rate=stats['read'] / elapsed if elapsed else 0, **stats))
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'json')
+        chunk_size = options['chunk_size']
+        stats = {'read': 0, 'imported': 0, 'skipped': 0, 'invalid': 0}
+        started = time.monotonic()
+
+        try:
+            with open(path, encoding='utf-8') as fp:
+                records = (iter_json_lines(fp) if file_format == 'jsonl'
+                           else iter_json_array(fp))
+                chunk = []
+                for data in self.validate(records, stats):
+                    chunk.append(data)
+                    if len(chunk) >= chunk_size:
+                        self.save_chunk(chunk, stats)
+                        self.report(stats, started)
+                        chunk = []
+                if chunk:
+                    self.save_chunk(chunk, stats)
+        except (OSError, ValueError) as exc:
+            raise CommandError('Can\'t import {}: {}'.format(path, exc))
+
+        self.report(stats, started)
+        self.stdout.write(self.style.SUCCESS('Import finished.'))
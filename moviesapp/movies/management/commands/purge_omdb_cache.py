@@ -0,0 +1,28 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from movies import omdb
+
+
+class Command(BaseCommand):
+    help = (
+        'Purge cached OMDb answers for not found movies and errors, so the '
+        'next request for the title is sent to OMDb.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Purge also cached data of found movies.',
+        )
+
+    def handle(self, *args, **options):
+        omdb.get_client().purge(negative=True, found=options['all'])
+        self.stdout.write(self.style.SUCCESS('OMDb cache has been purged.'))
+        # Running servers see the purge only through a shared cache backend
+        if isinstance(caches['default'], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                'Cache backend is local to this process, so memory caches of '
+                'running servers have not been purged - set a shared '
+                'CACHE_BACKEND or use POST /omdb/purge/.'))
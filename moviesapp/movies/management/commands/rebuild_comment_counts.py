@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from movies import signals
+from movies.models import Comment, CommentDailyCount
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild daily comments counts used by /top/ from scratch and check '
+        'them against existing comments.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare daily counts with comments, without rebuild.',
+        )
+
+    @staticmethod
+    def comments_per_day():
+        return Comment.objects.order_by().values(
+            'movie', 'created').annotate(total=Count('pk'))
+
+    def rebuild(self):
+        with transaction.atomic():
+            CommentDailyCount.objects.all().delete()
+            CommentDailyCount.objects.bulk_create(
+                (CommentDailyCount(movie_id=row['movie'], day=row['created'],
+                                   count=row['total'])
+                 for row in self.comments_per_day().iterator()),
+                batch_size=1000,
+            )
+            # bulk_create() doesn't send signals, so rankings and responses
+            # cached from the previous counts are invalidated here
+            signals.invalidate('top')
+            signals.invalidate('responses')
+
+    def find_mismatches(self):
+        expected = {
+            (row['movie'], row['created']): row['total']
+            for row in self.comments_per_day().iterator()
+        }
+        stored = {
+            (row['movie'], row['day']): row['count']
+            for row in CommentDailyCount.objects.filter(
+                count__gt=0).values('movie', 'day', 'count').iterator()
+        }
+        return sorted(
+            (movie, day, expected.get((movie, day), 0),
+             stored.get((movie, day), 0))
+            for movie, day in expected.keys() | stored.keys()
+            if expected.get((movie, day)) != stored.get((movie, day))
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            self.rebuild()
+            self.stdout.write('Daily comments counts have been rebuilt.')
+
+        mismatches = self.find_mismatches()
+        for movie, day, expected, stored in mismatches:
+            self.stderr.write(
+                'Movie ID {} on {}: {} comments, {} counted.'.format(
+                    movie, day, expected, stored))
+        if mismatches:
+            raise CommandError(
+                '{} daily counts don\'t match comments.'.format(
+                    len(mismatches)))
+        self.stdout.write(self.style.SUCCESS(
+            'Daily comments counts match comments.'))
@@ -0,0 +1,109 @@
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Quality of brotli compression - the highest quality (11) is too slow for
+# responses compressed on every request
+BROTLI_QUALITY = 5
+
+
+def brotli_string(content):
+    return brotli.compress(content, quality=BROTLI_QUALITY)
+
+
+# Items aren't flushed one by one - every flush ends a compressed block, the
+# compressor emits data when its buffer is full and the rest at the end
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# Supported content codings with functions compressing content and
+# streamed content, in order of preference when client accepts both
+ENCODINGS = [('gzip', (compress_string, compress_sequence))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', (brotli_string, brotli_sequence)))
+
+
+# Quality values of content codings from Accept-Encoding header, e.g.
+# "br;q=1.0, gzip;q=0.8, *;q=0.1"
+def parse_accept_encoding(header):
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+# The supported coding with the highest quality, None if client doesn't
+# accept any of them
+def negotiate_encoding(header):
+    qualities = parse_accept_encoding(header)
+    default = qualities.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding, _ in ENCODINGS:
+        quality = qualities.get(coding, default)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+# Responses are compressed with brotli (if it is installed) or gzip,
+# whichever is preferred by Accept-Encoding - the same way as GZipMiddleware
+# compresses them
+class CompressionMiddleware(MiddlewareMixin):
+    # It's not worth compressing really short responses
+    min_length = 200
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compress, compress_stream = dict(ENCODINGS)[encoding]
+
+        if response.streaming:
+            # Compressed size isn't known until the content is streamed
+            response.streaming_content = compress_stream(
+                response.streaming_content)
+            del response['Content-Length']
+        else:
+            # Compressed content is returned only if it's actually shorter
+            content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        # Strong ETag is made weak (RFC 7232 section 2.1), conditional
+        # requests still match it
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
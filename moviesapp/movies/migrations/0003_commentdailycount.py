@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_comments(apps, schema_editor):
+    Comment = apps.get_model('movies', 'Comment')
+    CommentDailyCount = apps.get_model('movies', 'CommentDailyCount')
+    rows = Comment.objects.order_by().values('movie', 'created').annotate(
+        total=models.Count('pk'))
+    CommentDailyCount.objects.bulk_create(
+        (CommentDailyCount(movie_id=row['movie'], day=row['created'],
+                           count=row['total'])
+         for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0002_auto_20190526_1229'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentDailyCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_comment_counts', to='movies.Movie')),
+            ],
+            options={
+                'unique_together': {('movie', 'day')},
+            },
+        ),
+        migrations.RunPython(
+            count_existing_comments, migrations.RunPython.noop
+        ),
+    ]
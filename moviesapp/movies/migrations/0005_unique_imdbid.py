@@ -0,0 +1,67 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+# Movies with the same imdbID are merged into the oldest one - comments and
+# daily comments counts are moved to it, other duplicates are removed
+def merge_duplicated_movies(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Comment = apps.get_model('movies', 'Comment')
+    CommentDailyCount = apps.get_model('movies', 'CommentDailyCount')
+    duplicated = Movie.objects.values('imdbID').annotate(
+        total=models.Count('pk'), kept=models.Min('pk')).filter(total__gt=1)
+    for row in duplicated:
+        merged = list(Movie.objects.filter(imdbID=row['imdbID']).exclude(
+            pk=row['kept']).values_list('pk', flat=True))
+        Comment.objects.filter(movie_id__in=merged).update(
+            movie_id=row['kept'])
+        for daily_count in CommentDailyCount.objects.filter(
+                movie_id__in=merged):
+            kept_count, _ = CommentDailyCount.objects.get_or_create(
+                movie_id=row['kept'], day=daily_count.day)
+            kept_count.count += daily_count.count
+            kept_count.save()
+        Movie.objects.filter(pk__in=merged).delete()
+    # Foreign keys are checked at commit on PostgreSQL - pending checks of
+    # removed movies would make ALTER TABLE below fail
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+# Index used by case-insensitive title lookups (Title__iexact)
+def create_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX movies_movie_title_upper '
+            'ON movies_movie (UPPER("Title"))')
+    elif schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE INDEX movies_movie_title_upper '
+            'ON movies_movie ("Title" COLLATE NOCASE)')
+
+
+# SQLite drops the index when later migrations rebuild movies table (it
+# isn't a part of the model), so it may be missing when this is reversed
+def drop_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP INDEX IF EXISTS movies_movie_title_upper')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_importlock'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicated_movies, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='imdbID',
+            field=models.CharField(max_length=20, unique=True),
+        ),
+        migrations.RunPython(create_title_index, drop_title_index),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_unique_imdbid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='box_office',
+            field=models.BigIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_rating',
+            field=models.DecimalField(db_index=True, decimal_places=1, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='imdb_votes',
+            field=models.PositiveIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='meta_score',
+            field=models.PositiveSmallIntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='released_date',
+            field=models.DateField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='runtime_minutes',
+            field=models.PositiveSmallIntegerField(db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+
+# Genres of existing movies parsed from their Genre field
+def fill_genres(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    Genre = apps.get_model('movies', 'Genre')
+    MovieGenre = Movie.genres.through
+    ids = {}
+    links = []
+    movies = Movie.objects.order_by('pk').values_list('pk', 'Genre')
+    for movie_id, value in movies.iterator():
+        names = {name.strip()[:50] for name in value.split(',')}
+        for name in sorted(names - {'', 'N/A'}):
+            if name not in ids:
+                ids[name] = Genre.objects.get_or_create(name=name)[0].pk
+            links.append(MovieGenre(movie_id=movie_id, genre_id=ids[name]))
+        if len(links) >= 1000:
+            MovieGenre.objects.bulk_create(links)
+            links = []
+    MovieGenre.objects.bulk_create(links)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_movie_typed_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='genres',
+            field=models.ManyToManyField(editable=False, related_name='movies', to='movies.Genre'),
+        ),
+        migrations.RunPython(fill_genres, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:24
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.db.models.functions import Floor
+
+
+# Number of existing movies for every facet value (genre, year, decade and
+# rating bucket), counted with one grouped query per facet
+def count_existing_movies(apps, schema_editor):
+    Movie = apps.get_model('movies', 'Movie')
+    FacetCount = apps.get_model('movies', 'FacetCount')
+    movies = Movie.objects.order_by()
+    queries = {
+        'genre': Movie.genres.through.objects.order_by().values(
+            value=F('genre__name')),
+        'year': movies.values(value=F('Year')),
+        'decade': movies.annotate(
+            value=F('Year') / 10 * 10).values('value'),
+        'rating': movies.annotate(
+            value=Floor('imdb_rating')).values('value'),
+    }
+    counts = defaultdict(Counter)
+    for facet, query in queries.items():
+        for row in query.annotate(total=Count('pk')):
+            value = '' if row['value'] is None else str(row['value'])
+            if facet != 'genre' and value:
+                value = str(int(float(value)))
+            counts[facet][value] += row['total']
+    FacetCount.objects.bulk_create(
+        (FacetCount(facet=facet, value=value, count=total)
+         for facet, values in counts.items()
+         for value, total in values.items())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_genre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=10)),
+                ('value', models.CharField(blank=True, max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value')},
+            },
+        ),
+        migrations.RunPython(
+            count_existing_movies, migrations.RunPython.noop
+        ),
+    ]
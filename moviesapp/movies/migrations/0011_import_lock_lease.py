@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+# Rows of the previous locks are never held outside of a running import, so
+# they are removed instead of getting a lease
+def remove_locks(apps, schema_editor):
+    ImportLock = apps.get_model('movies', 'ImportLock')
+    ImportLock.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_locks, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='importlock',
+            name='expires',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='importlock',
+            name='result',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:40
+
+from django.db import migrations
+
+# Full-text search index of movies (see movies.search) - statements are
+# copied here, so later changes of the search don't change this migration
+
+# PostgreSQL - GIN index on tsvector of searched fields, built concurrently,
+# so writes to movies aren't blocked while the index is created
+PG_CREATE = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS movies_movie_search '
+    'ON movies_movie USING GIN (('
+    "setweight(to_tsvector('english', \"Title\"), 'A') || "
+    "setweight(to_tsvector('english', \"Actors\"), 'B') || "
+    "setweight(to_tsvector('english', \"Director\"), 'B') || "
+    "setweight(to_tsvector('english', \"Genre\"), 'B') || "
+    "setweight(to_tsvector('english', \"Plot\"), 'C')))"
+)
+PG_DROP = 'DROP INDEX CONCURRENTLY IF EXISTS movies_movie_search'
+
+# SQLite - FTS5 table with content of movies table updated by triggers,
+# existing movies are indexed by 'rebuild' command
+COLUMNS = '"Title", "Actors", "Director", "Genre", "Plot"'
+NEW = 'new."Title", new."Actors", new."Director", new."Genre", new."Plot"'
+OLD = 'old."Title", old."Actors", old."Director", old."Genre", old."Plot"'
+FTS_INSERT = (
+    'INSERT INTO movies_movie_fts(rowid, {}) VALUES (new.id, {})'
+).format(COLUMNS, NEW)
+FTS_DELETE = (
+    'INSERT INTO movies_movie_fts(movies_movie_fts, rowid, {}) '
+    "VALUES ('delete', old.id, {})"
+).format(COLUMNS, OLD)
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS movies_movie_fts USING fts5({}, '
+    "content='movies_movie', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')".format(COLUMNS),
+    'CREATE TRIGGER IF NOT EXISTS movies_movie_fts_insert AFTER INSERT ON '
+    'movies_movie BEGIN {}; END'.format(FTS_INSERT),
+    'CREATE TRIGGER IF NOT EXISTS movies_movie_fts_delete AFTER DELETE ON '
+    'movies_movie BEGIN {}; END'.format(FTS_DELETE),
+    'CREATE TRIGGER IF NOT EXISTS movies_movie_fts_update AFTER UPDATE OF {} '
+    'ON movies_movie BEGIN {}; {}; END'.format(
+        COLUMNS, FTS_DELETE, FTS_INSERT),
+    "INSERT INTO movies_movie_fts(movies_movie_fts) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS movies_movie_fts_insert',
+    'DROP TRIGGER IF EXISTS movies_movie_fts_delete',
+    'DROP TRIGGER IF EXISTS movies_movie_fts_update',
+    'DROP TABLE IF EXISTS movies_movie_fts',
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PG_CREATE)
+    elif schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_CREATE:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(PG_DROP)
+    elif schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_DROP:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    # Index can't be created concurrently inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('movies', '0011_import_lock_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
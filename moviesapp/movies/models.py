@@ -1,6 +1,102 @@
-from django.db import models
+import re
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 from django.urls import reverse
 
+NUMBER = re.compile(r'\d[\d,]*(\.\d+)?')
+
+
+# Parsers of OMDb text values (e.g. "7.8", "1,234,567", "142 min", "$1,234",
+# "26 May 2019"), None is returned for "N/A" and other invalid values
+def parse_decimal(value):
+    match = NUMBER.search(value or '')
+    if match is None:
+        return None
+    try:
+        return Decimal(match.group().replace(',', ''))
+    except InvalidOperation:
+        return None
+
+
+def parse_int(value, maximum=2 ** 31 - 1):
+    number = parse_decimal(value)
+    if number is None or number > maximum:
+        return None
+    return int(number)
+
+
+def parse_small_int(value):
+    return parse_int(value, maximum=2 ** 15 - 1)
+
+
+def parse_big_int(value):
+    return parse_int(value, maximum=2 ** 63 - 1)
+
+
+def parse_rating(value):
+    number = parse_decimal(value)
+    if number is None or number >= 100:
+        return None
+    return number.quantize(Decimal('0.1'))
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value or '', '%d %b %Y').date()
+    except ValueError:
+        return None
+
+
+# Names of genres from OMDb text, e.g. "Action, Drama"
+def parse_genres(value):
+    names = (name.strip() for name in (value or '').split(','))
+    return list(OrderedDict.fromkeys(
+        name[:Genre.NAME_LENGTH] for name in names if name and name != 'N/A'
+    ))
+
+
+class Genre(models.Model):
+    NAME_LENGTH = 50
+
+    name = models.CharField(max_length=NAME_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    # Set genres of movies parsed from their Genre field - missing genres are
+    # created and all links are saved with one query
+    @classmethod
+    def assign(cls, movies, created=False):
+        movies = [movie for movie in movies if movie.pk is not None]
+        if not movies:
+            return
+        names = {movie: parse_genres(movie.Genre) for movie in movies}
+        required = set().union(*names.values())
+        ids = dict(cls.objects.filter(name__in=required).values_list(
+            'name', 'pk'))
+        if required - set(ids):
+            cls.objects.bulk_create(
+                (cls(name=name) for name in required - set(ids)),
+                ignore_conflicts=True,
+            )
+            ids = dict(cls.objects.filter(name__in=required).values_list(
+                'name', 'pk'))
+        links = Movie.genres.through
+        if not created:
+            links.objects.filter(movie__in=movies).delete()
+        links.objects.bulk_create(
+            links(movie_id=movie.pk, genre_id=ids[name])
+            for movie, movie_names in names.items() for name in movie_names
+        )
+        for movie in movies:
+            movie._saved_genre = movie.Genre
+
 
 # Create Movie models based on data returned by OMDb.api
 class Movie(models.Model):
@@ -21,7 +117,7 @@ class Movie(models.Model):
     Metascore = models.CharField(max_length=20)
     imdbRating = models.CharField(max_length=20)
     imdbVotes = models.CharField(max_length=20)
-    imdbID = models.CharField(max_length=20)
+    imdbID = models.CharField(max_length=20, unique=True)
     Type = models.CharField(max_length=20)
     DVD = models.CharField(max_length=20)
     BoxOffice = models.CharField(max_length=40)
@@ -29,10 +125,89 @@ class Movie(models.Model):
     Website = models.CharField(max_length=100)
     Response = models.CharField(max_length=20)
     Created = models.DateField(auto_now_add=True)
+    # Time of the last change, used to validate cached responses
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # Typed copies of OMDb text fields used for filtering and ordering
+    imdb_rating = models.DecimalField(
+        max_digits=3, decimal_places=1, null=True, editable=False,
+        db_index=True)
+    imdb_votes = models.PositiveIntegerField(
+        null=True, editable=False, db_index=True)
+    meta_score = models.PositiveSmallIntegerField(
+        null=True, editable=False, db_index=True)
+    runtime_minutes = models.PositiveSmallIntegerField(
+        null=True, editable=False, db_index=True)
+    box_office = models.BigIntegerField(
+        null=True, editable=False, db_index=True)
+    released_date = models.DateField(
+        null=True, editable=False, db_index=True)
+    # Genres parsed from Genre field (the model is referenced by name,
+    # because Genre is also a field of the movie)
+    genres = models.ManyToManyField(
+        'Genre', related_name='movies', editable=False)
+
+    # OMDb field: (typed field, parser)
+    TYPED_FIELDS = {
+        'imdbRating': ('imdb_rating', parse_rating),
+        'imdbVotes': ('imdb_votes', parse_int),
+        'Metascore': ('meta_score', parse_small_int),
+        'Runtime': ('runtime_minutes', parse_small_int),
+        'BoxOffice': ('box_office', parse_big_int),
+        'Released': ('released_date', parse_date),
+    }
+
+    class Meta:
+        # Lists filtered by year and ordered by year or title, primary key
+        # is the tiebreaker of pagination
+        indexes = [
+            models.Index(fields=['Year', 'id'], name='movie_year_id_idx'),
+            models.Index(fields=['Title', 'id'], name='movie_title_id_idx'),
+        ]
 
     def __str__(self):
         return 'ID {}: {}'.format(str(self.pk), self.Title)
 
+    # Typed fields have to be set before bulk_create(), which doesn't call
+    # save()
+    def set_typed_fields(self):
+        for field, (typed_field, parse) in self.TYPED_FIELDS.items():
+            setattr(self, typed_field, parse(getattr(self, field)))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Genres are saved again only if Genre field changes
+        if 'Genre' in field_names:
+            instance._saved_genre = values[field_names.index('Genre')]
+        # Remember facet values, so their counts can be moved when the movie
+        # is updated (see movies.signals)
+        if {'Genre', 'Year', 'imdb_rating'}.issubset(field_names):
+            instance._counted_facets = instance.get_facets()
+        return instance
+
+    # Facet values of the movie as (facet, value) pairs - rating bucket 8
+    # contains ratings from 8.0 to 8.9, movies without rating have empty bucket
+    def get_facets(self):
+        rating = self.imdb_rating
+        facets = [('genre', name) for name in parse_genres(self.Genre)]
+        facets.extend([
+            ('year', str(self.Year)),
+            ('decade', str(self.Year // 10 * 10)),
+            ('rating', '' if rating is None else str(int(rating))),
+        ])
+        return facets
+
+    def save(self, *args, **kwargs):
+        self.set_typed_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields).union(
+                typed_field
+                for field, (typed_field, _) in self.TYPED_FIELDS.items()
+                if field in update_fields
+            )
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('movies:movie-detail', args=[self.pk])
 
@@ -43,19 +218,129 @@ class Rating(models.Model):
     Movie = models.ForeignKey(
         Movie, on_delete=models.CASCADE, related_name="Ratings"
     )
+    # Time of the last change, used to validate cached responses
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return 'Rating from {} to {}'.format(self.Source, self.Movie.Title)
 
 
+# Row held while the movie with requested title is fetched from OMDb and
+# saved, so concurrent requests for the same title (also from other
+# processes) wait for it instead of requesting OMDb again. The holder records
+# outcome of the import, which is read by waiters until the row expires.
+class ImportLock(models.Model):
+    key = models.CharField(max_length=40, unique=True)
+    # End of the holder's lease, or of the recorded outcome
+    expires = models.DateTimeField(db_index=True)
+    # imdbID of the imported movie, empty if it hasn't been found in OMDb,
+    # None while the import is running
+    result = models.CharField(max_length=20, null=True, blank=True)
+
+    def __str__(self):
+        return 'Import lock {}'.format(self.key)
+
+
 # Create comments Models for movies
 class Comment(models.Model):
     user = models.CharField(max_length=15)
     comment = models.TextField()
     created = models.DateField(auto_now_add=True)
+    # Time of the last change, used to validate cached responses
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+    # Comments of a movie are read through the composite index below, which
+    # starts with the movie - a separate index of the key isn't needed
     movie = models.ForeignKey(
-        Movie, on_delete=models.CASCADE, related_name='comments'
+        Movie, on_delete=models.CASCADE, related_name='comments',
+        db_index=False,
     )
 
+    class Meta:
+        # Comments ordered by default ordering (created, user) - all of
+        # them, or comments of a movie or of a user
+        indexes = [
+            models.Index(fields=['movie', 'created', 'user'],
+                         name='comment_movie_created_idx'),
+            models.Index(fields=['created', 'user'],
+                         name='comment_created_user_idx'),
+            models.Index(fields=['user', 'created'],
+                         name='comment_user_created_idx'),
+        ]
+
     def __str__(self):
         return 'Comment by {} - movie {}'.format(self.user, self.movie.Title)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored movie and day, so the daily counts can be moved
+        # when the comment is updated (see movies.signals)
+        loaded = dict(zip(field_names, values))
+        instance._counted_as = (loaded.get('movie_id'), loaded.get('created'))
+        return instance
+
+
+# Number of comments added to a movie on particular day - updated on every
+# comment write, used to build ranking of top commented movies
+class CommentDailyCount(models.Model):
+    movie = models.ForeignKey(
+        Movie, on_delete=models.CASCADE, related_name='daily_comment_counts'
+    )
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('movie', 'day')
+
+    def __str__(self):
+        return '{} comments on {} - movie ID {}'.format(
+            self.count, self.day, self.movie_id)
+
+    @classmethod
+    def add(cls, movie_id, day, delta):
+        counts = cls.objects.filter(movie_id=movie_id, day=day)
+        if counts.update(count=F('count') + delta) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(movie_id=movie_id, day=day, count=delta)
+        except IntegrityError:
+            # Row has been created by concurrent request in the meantime
+            counts.update(count=F('count') + delta)
+
+
+# Number of movies with particular value of facet (genre, year, decade or
+# rating bucket) - updated on every movie write, used by facets of all movies
+class FacetCount(models.Model):
+    facet = models.CharField(max_length=10)
+    value = models.CharField(max_length=Genre.NAME_LENGTH, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value')
+
+    def __str__(self):
+        return '{} movies with {} {}'.format(self.count, self.facet, self.value)
+
+    # Move movies from old facet values to new ones - missing rows are
+    # inserted first, so concurrent writes can't lose any change, and counts
+    # changed by the same number are updated with one query
+    @classmethod
+    def move(cls, old, new):
+        deltas = Counter(new)
+        deltas.subtract(old)
+        changed = defaultdict(list)
+        for key, delta in sorted(deltas.items()):
+            if delta:
+                changed[delta].append(key)
+        added = [key for delta, keys in changed.items() if delta > 0
+                 for key in keys]
+        if added:
+            cls.objects.bulk_create(
+                (cls(facet=facet, value=value) for facet, value in added),
+                ignore_conflicts=True,
+            )
+        for delta, keys in changed.items():
+            cls.objects.filter(reduce(or_, (
+                Q(facet=facet, value=value) for facet, value in keys
+            ))).update(count=F('count') + delta)
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.core.cache.backends.filebased import FileBasedCache
+
+from movies import cache
+from moviesapp.settings import (
+    OMDb_API_KEY,
+    OMDb_BACKOFF_FACTOR,
+    OMDb_CACHE_DIR,
+    OMDb_CACHE_SIZE,
+    OMDb_CACHE_TTL,
+    OMDb_NEGATIVE_CACHE_TTL,
+    OMDb_POOL_SIZE,
+    OMDb_RETRIES,
+    OMDb_TIMEOUT,
+    OMDb_URL,
+)
+
+
+class OMDbError(Exception):
+    """OMDb can't be reached or it responds with server error."""
+
+
+# Titles which differ only in letter case or whitespaces share cache entry
+def normalize_title(title):
+    return ' '.join(title.split()).casefold()
+
+
+# In-memory cache limited to maxsize entries - the least recently used entry
+# is removed first, every entry expires after ttl seconds
+class TTLCache:
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return None
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class OMDbClient:
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, url=OMDb_URL, api_key=OMDb_API_KEY,
+                 timeout=OMDb_TIMEOUT, retries=OMDb_RETRIES,
+                 backoff_factor=OMDb_BACKOFF_FACTOR, pool_size=OMDb_POOL_SIZE,
+                 cache_size=OMDb_CACHE_SIZE, cache_ttl=OMDb_CACHE_TTL,
+                 negative_cache_ttl=OMDb_NEGATIVE_CACHE_TTL,
+                 cache_dir=OMDb_CACHE_DIR):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        # Connections are kept alive and reused between requests
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.negative_cache = TTLCache(cache_size, negative_cache_ttl)
+        self.disk_cache = self.negative_disk_cache = None
+        if cache_dir:
+            self.disk_cache = FileBasedCache(cache_dir, {
+                'TIMEOUT': cache_ttl,
+                'OPTIONS': {'MAX_ENTRIES': cache_size * 10},
+            })
+            self.negative_disk_cache = FileBasedCache(
+                os.path.join(cache_dir, 'negative'), {
+                    'TIMEOUT': negative_cache_ttl,
+                    'OPTIONS': {'MAX_ENTRIES': cache_size * 10},
+                })
+
+    def request(self, params):
+        params = dict(params, apikey=self.api_key)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+            try:
+                response = self.session.get(
+                    self.url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+                continue
+            if response.status_code not in self.RETRY_STATUSES:
+                return response
+            error = 'status code {}'.format(response.status_code)
+        raise OMDbError('OMDb request failed: {}'.format(error))
+
+    @staticmethod
+    def disk_key(key):
+        return 'omdb:' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    # Memory entries are keyed with generation of namespace, so purge made by
+    # any process sharing the cache backend (see CACHES) applies to all of
+    # them. Disk entries are shared by processes of the host, purge removes
+    # them directly.
+    @staticmethod
+    def get_tiered(memory, disk, namespace, key):
+        memory_key = '{}:{}'.format(cache.get_generation(namespace), key)
+        data = memory.get(memory_key)
+        if data is None and disk is not None:
+            data = disk.get(OMDbClient.disk_key(key))
+            if data is not None:
+                memory.set(memory_key, data)
+        return data
+
+    @staticmethod
+    def set_tiered(memory, disk, namespace, key, data):
+        memory.set('{}:{}'.format(cache.get_generation(namespace), key), data)
+        if disk is not None:
+            disk.set(OMDbClient.disk_key(key), data)
+
+    # Return data of the movie from OMDb, data of found movie contains
+    # 'Response': 'True'
+    def get_movie(self, title):
+        return self.get(normalize_title(title), {'t': title, 'type': 'movie'})
+
+    def get_movie_by_id(self, imdb_id):
+        imdb_id = imdb_id.strip()
+        return self.get(
+            'id:' + imdb_id.lower(), {'i': imdb_id, 'type': 'movie'})
+
+    def get(self, key, params):
+        data = self.get_tiered(self.cache, self.disk_cache, 'omdb', key)
+        cache.record('omdb', data is not None)
+        if data is not None:
+            return data
+
+        data = self.get_tiered(self.negative_cache, self.negative_disk_cache,
+                               'omdb_negative', key)
+        # Every hit of negative cache saves one request to OMDb
+        cache.record('omdb_negative', data is not None)
+        if data is not None:
+            return data
+
+        response = self.request(params)
+        try:
+            data = dict(response.json())
+        except (TypeError, ValueError):
+            data = {}
+        # Error answer without OMDb error message
+        if (response.status_code != requests.codes.ok and
+                data.get('Response') != 'False') or 'Response' not in data:
+            data = {'Response': 'False',
+                    'Error': 'Status code {}'.format(response.status_code)}
+        if data.get('Response') == 'True':
+            self.set_tiered(self.cache, self.disk_cache, 'omdb', key, data)
+        else:
+            self.set_tiered(self.negative_cache, self.negative_disk_cache,
+                            'omdb_negative', key, data)
+        return data
+
+    def purge(self, negative=True, found=False):
+        if negative:
+            cache.bump_generation('omdb_negative')
+            self.negative_cache.clear()
+            if self.negative_disk_cache is not None:
+                self.negative_disk_cache.clear()
+        if found:
+            cache.bump_generation('omdb')
+            self.cache.clear()
+            if self.disk_cache is not None:
+                self.disk_cache.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# Client shared by all threads of the process
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OMDbClient()
+        return _client
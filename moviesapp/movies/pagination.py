@@ -1,13 +1,418 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import json
+from base64 import b64decode, b64encode, urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import partial
 
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator
+)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination, LimitOffsetPagination, PageNumberPagination
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class MoviesLimitPagination(PageNumberPagination):
+from movies.cache import get_row_count
+from moviesapp.settings import COUNT_CACHE_TIMEOUT
+
+
+# Keyset pagination - page starts after (or before) the row whose ordering
+# values are passed in opaque cursor, so there isn't any COUNT query or OFFSET
+# scan and deep pages are as fast as the first one. Primary key is always the
+# last ordering field, so position of every row is unique. Fields ordered
+# with nulls last (F().asc(nulls_last=True)) can contain NULL values.
+class KeysetPagination(BasePagination):
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.attnames = [
+            self.get_attname(queryset, name) for name, _, _ in self.ordering
+        ]
+        values, self.reverse = self.decode_cursor(request)
+        self.has_cursor = values is not None
+
+        queryset = self.load_columns(queryset).order_by(*[
+            self.get_order_by(name, desc, nulls_last)
+            for name, desc, nulls_last in self.ordering
+        ])
+        if values is not None:
+            queryset = queryset.filter(self.get_position_filter(values))
+        # Fetch one more row to check if the next page exists
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    # Ordering applied by OrderingFilter with primary key as tiebreaker -
+    # (name, descending, nulls last or None if values can't be NULL)
+    def get_ordering(self, queryset):
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for term in queryset.query.order_by or ('pk', ):
+            if isinstance(term, OrderBy) and isinstance(term.expression, F):
+                name, desc = term.expression.name, term.descending
+                nulls_last = True
+            elif isinstance(term, str):
+                name, desc = term.lstrip('-'), term.startswith('-')
+                nulls_last = None
+            else:
+                raise NotFound(self.invalid_cursor_message)
+            name = pk_name if name == 'pk' else name
+            ordering.append((name, desc, nulls_last))
+            if name == pk_name:
+                break
+        else:
+            ordering.append((pk_name, False, None))
+        return ordering
+
+    # Ordering of the page - reversed when previous page is fetched
+    def get_order_by(self, name, desc, nulls_last):
+        desc = desc != self.reverse
+        if nulls_last is None:
+            return '{}{}'.format('-' if desc else '', name)
+        nulls_last = nulls_last != self.reverse
+        if desc:
+            return F(name).desc(
+                nulls_last=nulls_last, nulls_first=not nulls_last)
+        return F(name).asc(nulls_last=nulls_last, nulls_first=not nulls_last)
+
+    # Attribute of rows with ordering value - model field or annotation
+    def get_attname(self, queryset, name):
+        if name in queryset.query.annotations:
+            return name
+        try:
+            return queryset.model._meta.get_field(name).attname
+        except FieldDoesNotExist:
+            raise NotFound(self.invalid_cursor_message)
+
+    # Columns deferred by .only() (or not selected by .values()) which are
+    # needed to build cursors
+    def load_columns(self, queryset):
+        query = queryset.query
+        if query.values_select:
+            return queryset.values(*dict.fromkeys(
+                query.values_select + tuple(query.annotation_select) +
+                tuple(self.attnames)))
+        names, defer = queryset.query.deferred_loading
+        if defer:
+            return queryset
+        return queryset.only(*names.union(
+            name for name, _, _ in self.ordering
+            if name not in queryset.query.annotations
+        ))
+
+    # Rows placed after (before in reversed mode) row with given values
+    def get_position_filter(self, values):
+        position = Q()
+        for index, (name, desc, nulls_last) in enumerate(self.ordering):
+            condition = self.get_after_filter(
+                name, desc, nulls_last, values[index])
+            if condition is None:
+                continue
+            for prev_index, (prev_name, _, _) in enumerate(
+                    self.ordering[:index]):
+                condition &= self.get_equal_filter(
+                    prev_name, values[prev_index])
+            position |= condition
+        return position
+
+    # Rows placed after value of single field, None if there aren't any
+    def get_after_filter(self, name, desc, nulls_last, value):
+        nulls_last = nulls_last is not None and nulls_last != self.reverse
+        if value is None:
+            # NULLs are placed at the end, or before all other values
+            if nulls_last:
+                return None
+            return Q(**{'{}__isnull'.format(name): False})
+        lookup = 'lt' if desc != self.reverse else 'gt'
+        condition = Q(**{'{}__{}'.format(name, lookup): value})
+        if nulls_last:
+            condition |= Q(**{'{}__isnull'.format(name): True})
+        return condition
+
+    @staticmethod
+    def get_equal_filter(name, value):
+        if value is None:
+            return Q(**{'{}__isnull'.format(name): True})
+        return Q(**{name: value})
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode('ascii')))
+            values, reverse = data['v'], bool(data['r'])
+        except (UnicodeError, ValueError, TypeError, KeyError,
+                binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(values, list) or
+                len(values) != len(self.ordering) or
+                data.get('o') != self.get_ordering_key()):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    # Cursor is valid only for ordering it has been created with
+    def get_ordering_key(self):
+        return ','.join(
+            '{}{}'.format('-' if desc else '', name)
+            for name, desc, _ in self.ordering
+        )
+
+    def encode_cursor(self, row, reverse):
+        values = [
+            row[attname] if isinstance(row, dict) else getattr(row, attname)
+            for attname in self.attnames
+        ]
+        data = json.dumps(
+            {'v': values, 'r': reverse, 'o': self.get_ordering_key()},
+            cls=DjangoJSONEncoder, separators=(',', ':'),
+        )
+        cursor = urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+
+# Page number pagination, switched to keyset pagination if it is requested
+# with ?pagination=cursor or cursor of the page is passed
+class KeysetSwitchMixin:
+    keyset_class = KeysetPagination
+    mode_query_param = 'pagination'
+    keyset = None
+
+    def use_keyset(self, request):
+        return (request.query_params.get(self.mode_query_param) == 'cursor' or
+                self.keyset_class.cursor_query_param in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_keyset(request):
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+# Page of EstimatedCountPaginator - the next page exists if one more row than
+# page size has been fetched
+class EstimatedCountPage(Page):
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+
+# Count of all rows is cached until rows are added or removed (large tables
+# on PostgreSQL are estimated from planner statistics), count of filtered
+# rows is capped, so counting never scans more than cap + 1 rows. The count
+# is only displayed - pages are validated by rows found at their offset, so
+# pages after the capped (or underestimated) count are still available.
+class EstimatedCountPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, exact=False, cap=10000,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.exact = exact
+        self.cap = cap
+        self.capped = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by().values('pk')
+        if self.exact:
+            return queryset.count()
+        if not queryset.query.where:
+            return self.get_total(queryset)
+        count = queryset[:self.cap + 1].count()
+        self.capped = count > self.cap
+        return count
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        # Fetch one more row to check if the next page exists
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        page = EstimatedCountPage(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+    # Count shown in response, e.g. "10000+" if it has been capped
+    @property
+    def display_count(self):
+        count = self.count
+        return '{}+'.format(self.cap) if self.capped else count
+
+    def get_total(self, queryset):
+        estimate = self.estimate(queryset)
+        if estimate is not None and estimate > self.cap:
+            return estimate
+        return get_row_count(queryset, COUNT_CACHE_TIMEOUT)
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+
+# Page number pagination with estimated count, exact count of rows is
+# returned only if it is requested with ?count=exact
+class EstimatedCountMixin:
+    count_query_param = 'count'
+    count_cap = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        exact = request.query_params.get(self.count_query_param) == 'exact'
+        self.django_paginator_class = partial(
+            EstimatedCountPaginator, exact=exact, cap=self.count_cap)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.display_count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class MoviesLimitPagination(KeysetSwitchMixin, EstimatedCountMixin,
+                            PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
-class CommentsLimitPagination(PageNumberPagination):
+class CommentsLimitPagination(KeysetSwitchMixin, EstimatedCountMixin,
+                              PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+# Pagination of ranking - position of the page is passed as opaque cursor and
+# there isn't any COUNT query, only requested rows are fetched from DB
+class TopCursorPagination(LimitOffsetPagination):
+    default_limit = 10
+    max_limit = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+        # Fetch one more row to check if the next page exists
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_offset(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return 0
+        try:
+            offset = int(b64decode(cursor.encode('ascii')).decode('ascii'))
+        except (UnicodeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def encode_cursor(self, offset):
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        if offset <= 0:
+            return remove_query_param(url, self.cursor_query_param)
+        cursor = b64encode(str(offset).encode('ascii')).decode('ascii')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        return self.encode_cursor(self.offset - self.limit)
@@ -0,0 +1,38 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Line and paragraph separators are escaped, the same as JSONRenderer does,
+# so JSON can be embedded in JavaScript
+ESCAPED = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+# Compact UTF-8 JSON rendered by orjson (or json if it isn't installed).
+# Datetimes and other types unsupported by orjson are encoded by DRF's
+# encoder, so output is the same as JSONRenderer's.
+def dumps(data):
+    if orjson is None:
+        return JSONRenderer().render(data)
+    content = orjson.dumps(
+        data, default=JSONEncoder().default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+    for character, escaped in ESCAPED:
+        content = content.replace(character, escaped)
+    return content
+
+
+# JSONRenderer with faster encoding of compact JSON, indented JSON (e.g.
+# Accept: application/json; indent=4) is rendered by JSONRenderer
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return dumps(data)
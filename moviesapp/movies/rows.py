@@ -0,0 +1,73 @@
+from operator import itemgetter
+
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+# Fields whose representation is the value fetched from the database, so
+# they are mapped without calling to_representation()
+PLAIN_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+# Primary key used to reverse url once, every url is built by replacing it
+URL_PLACEHOLDER = 9876543210123
+
+
+# Function which returns url of the view for given primary key - url is
+# reversed only once (e.g. once per request), the same as
+# HyperlinkedIdentityField returns
+def url_builder(view_name, request=None, lookup_url_kwarg='pk'):
+    url = reverse(view_name, kwargs={lookup_url_kwarg: URL_PLACEHOLDER},
+                  request=request)
+    prefix, suffix = url.split(str(URL_PLACEHOLDER))
+
+    def build(pk):
+        return '{}{}{}'.format(prefix, pk, suffix)
+    return build
+
+
+# Function which converts value of column with field's to_representation(),
+# None is represented as None, the same as in Serializer
+def converter(column, field):
+    def convert(row):
+        value = row[column]
+        return None if value is None else field.to_representation(value)
+    return convert
+
+
+# Rows of values() mapped to the same data as serializer returns for model
+# instances. Fields of columns and annotations are mapped by functions
+# compiled once, the other ones (e.g. urls, nested data) have to be given
+# as mappers of rows.
+class RowMapper:
+
+    def __init__(self, model, fields, mapped=(), field_columns=None):
+        self.fields = fields
+        self.mapped = set(mapped)
+        columns = [model._meta.pk.name]
+        for name, field in fields.items():
+            if name in self.mapped:
+                columns.extend((field_columns or {}).get(name, ()))
+            else:
+                columns.append(field.source)
+        # Columns of values() - without duplicates, in order of fields
+        self.columns = list(dict.fromkeys(columns))
+
+    def compile(self, mappers):
+        getters = []
+        for name, field in self.fields.items():
+            if name in self.mapped:
+                getters.append((name, mappers[name]))
+            elif isinstance(field, PLAIN_FIELDS):
+                getters.append((name, itemgetter(field.source)))
+            else:
+                getters.append((name, converter(field.source, field)))
+
+        def to_data(row):
+            return {name: get(row) for name, get in getters}
+        return to_data
+
+    def map(self, rows, mappers):
+        to_data = self.compile(mappers)
+        return [to_data(row) for row in rows]
@@ -0,0 +1,154 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connections
+from django.db.models import BooleanField, F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Searched fields of movies with their weights used by ranking
+SEARCH_FIELDS = (
+    ('Title', 'A'),
+    ('Actors', 'B'),
+    ('Director', 'B'),
+    ('Genre', 'B'),
+    ('Plot', 'C'),
+)
+# Weights of fields in SQLite bm25() for PostgreSQL weights A, B and C
+SQLITE_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 1.0}
+
+# PostgreSQL - GIN index on tsvector of searched fields, the same expression
+# is used in queries, so the index is used and it is always up to date
+PG_INDEX = 'movies_movie_search'
+PG_CONFIG = 'english'
+PG_VECTOR = ' || '.join(
+    "setweight(to_tsvector('{}', \"{}\"), '{}')".format(PG_CONFIG, field, w)
+    for field, w in SEARCH_FIELDS
+)
+
+# SQLite - FTS5 table with content taken from movies table, it is updated by
+# triggers on every insert, update and delete of a movie
+FTS_TABLE = 'movies_movie_fts'
+FTS_COLUMNS = ', '.join('"{}"'.format(field) for field, _ in SEARCH_FIELDS)
+FTS_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, '
+    "content='movies_movie', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON movies_movie '
+    'BEGIN {insert}; END',
+    'CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON movies_movie '
+    'BEGIN {delete}; END',
+    'CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF {columns} '
+    'ON movies_movie BEGIN {delete}; {insert}; END',
+    "INSERT INTO {table}({table}) VALUES ('rebuild')",
+)
+
+
+def get_fts_sql():
+    new = ', '.join('new."{}"'.format(field) for field, _ in SEARCH_FIELDS)
+    old = ', '.join('old."{}"'.format(field) for field, _ in SEARCH_FIELDS)
+    insert = 'INSERT INTO {}(rowid, {}) VALUES (new.id, {})'.format(
+        FTS_TABLE, FTS_COLUMNS, new)
+    delete = (
+        "INSERT INTO {table}({table}, rowid, {columns}) "
+        "VALUES ('delete', old.id, {old})"
+    ).format(table=FTS_TABLE, columns=FTS_COLUMNS, old=old)
+    return [
+        sql.format(table=FTS_TABLE, columns=FTS_COLUMNS, insert=insert,
+                   delete=delete)
+        for sql in FTS_SQL
+    ]
+
+
+# Create search index if it doesn't exist, existing movies are indexed.
+# It is created by migration 0012_search_index, this is the fallback used
+# after migrate (see movies.signals) - on SQLite triggers are recreated,
+# because they are dropped together with movies table when migrations
+# rebuild it.
+def create_index(using='default'):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS {} ON movies_movie '
+                'USING GIN (({}))'.format(PG_INDEX, PG_VECTOR))
+        elif connection.vendor == 'sqlite':
+            names = [FTS_TABLE] + [
+                '{}_{}'.format(FTS_TABLE, action)
+                for action in ('insert', 'delete', 'update')
+            ]
+            cursor.execute(
+                'SELECT COUNT(*) FROM sqlite_master WHERE name IN '
+                '(%s, %s, %s, %s)', names)
+            if cursor.fetchone()[0] < len(names):
+                for sql in get_fts_sql():
+                    cursor.execute(sql)
+
+
+# Ids of rows matching FTS query, for pk__in lookup. In lookup adds
+# parentheses itself, doubled ones are read by SQLite as a single value.
+class MatchedRows(RawSQL):
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+# Relevance of movie's row in FTS table. Movie's pk is an expression, so it
+# follows the table alias when queryset is used as a subquery.
+class MatchRank(Func):
+    output_field = FloatField()
+
+    def __init__(self, match, weights):
+        super().__init__(F('pk'))
+        self.match = match
+        self.weights = weights
+
+    def as_sql(self, compiler, connection):
+        pk, params = compiler.compile(self.get_source_expressions()[0])
+        sql = (
+            '(SELECT -bm25({0}, {1}) FROM {0} WHERE {0} MATCH %s '
+            'AND rowid = {2})'.format(FTS_TABLE, self.weights, pk)
+        )
+        return sql, [self.match] + params
+
+
+# Words of searched text, all of them have to be found in a movie
+def get_terms(text):
+    return re.findall(r'\w+', text)
+
+
+# Movies matching searched text, annotated with relevance (search_rank),
+# the higher rank the better match
+def search(queryset, text):
+    terms = get_terms(text)
+    if not terms:
+        return queryset.annotate(
+            search_rank=Value(0.0, FloatField())).none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = "plainto_tsquery('{}', %s)".format(PG_CONFIG)
+        text = ' '.join(terms)
+        # Filter on annotation instead of extra(), so the condition is a part
+        # of the query's where (e.g. facets of searched movies are counted)
+        return queryset.annotate(search_match=RawSQL(
+            '({}) @@ {}'.format(PG_VECTOR, query), [text],
+            output_field=BooleanField(),
+        )).filter(search_match=True).annotate(search_rank=RawSQL(
+            'ts_rank(({}), {})'.format(PG_VECTOR, query), [text],
+            output_field=FloatField(),
+        ))
+    if vendor == 'sqlite':
+        match = ' '.join('"{}"'.format(term) for term in terms)
+        weights = ', '.join(
+            str(SQLITE_WEIGHTS[weight]) for _, weight in SEARCH_FIELDS)
+        return queryset.filter(pk__in=MatchedRows(
+            'SELECT rowid FROM {0} WHERE {0} MATCH %s'.format(FTS_TABLE),
+            [match],
+        )).annotate(search_rank=MatchRank(match, weights))
+    # Other databases - no index, every word has to be found in any field
+    for term in terms:
+        queryset = queryset.filter(reduce(or_, (
+            Q(**{'{}__icontains'.format(field): term})
+            for field, _ in SEARCH_FIELDS
+        )))
+    return queryset.annotate(search_rank=Value(0.0, FloatField()))
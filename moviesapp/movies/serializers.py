@@ -1,7 +1,48 @@
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.reverse import reverse
 
 from movies.models import Comment, Movie, Rating
+from movies.rows import url_builder
+from movies.signals import post_bulk_create
+
+# Typed copies of OMDb fields and genres are parsed on save and they aren't
+# serialized, neither time of the last change (it is sent in headers)
+DERIVED_FIELDS = [field for field, _ in Movie.TYPED_FIELDS.values()]
+DERIVED_FIELDS.extend(['genres', 'updated'])
+
+
+# Urls of views reversed once per serializer context (once per request),
+# serializers of all objects share them
+def get_url_builder(context, view_name, lookup_url_kwarg='pk'):
+    builders = context.setdefault('url_builders', {})
+    key = (view_name, lookup_url_kwarg)
+    if key not in builders:
+        builders[key] = url_builder(
+            view_name, context.get('request'), lookup_url_kwarg)
+    return builders[key]
+
+
+def get_url(context, view_name):
+    urls = context.setdefault('urls', {})
+    if view_name not in urls:
+        urls[view_name] = reverse(view_name, request=context.get('request'))
+    return urls[view_name]
+
+
+# HyperlinkedIdentityField which builds urls from template reversed once per
+# request instead of reversing url of every object
+class IdentityUrlField(serializers.HyperlinkedIdentityField):
+
+    def get_url(self, obj, view_name, request, format):
+        # Urls with format suffix are reversed as usual
+        if format:
+            return super().get_url(obj, view_name, request, format)
+        if hasattr(obj, 'pk') and obj.pk in (None, ''):
+            return None
+        build = get_url_builder(self.context, view_name,
+                                self.lookup_url_kwarg)
+        return build(getattr(obj, self.lookup_field))
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -15,13 +56,21 @@ class MovieSerializerSave(serializers.ModelSerializer):
 
     class Meta:
         model = Movie
-        fields = '__all__'
+        exclude = DERIVED_FIELDS
+        # Uniqueness is checked by DB index when the movie is inserted,
+        # instead of separate query
+        extra_kwargs = {'imdbID': {'validators': []}}
 
+    # Movie and all its ratings are saved together or not at all, ratings
+    # are inserted with one query
     def create(self, validated_data):
         ratings = validated_data.pop('Ratings')
-        movie = Movie.objects.create(**validated_data)
-        for rating in ratings:
-            Rating.objects.create(Movie=movie, **rating)
+        with transaction.atomic():
+            movie = Movie.objects.create(**validated_data)
+            ratings = Rating.objects.bulk_create(
+                Rating(Movie=movie, **rating) for rating in ratings
+            )
+            post_bulk_create.send(sender=Rating, objects=ratings)
         return movie
 
 
@@ -29,25 +78,56 @@ class MovieSerializerSave(serializers.ModelSerializer):
 # already exists in database
 class MovieSerializer(serializers.ModelSerializer):
     Ratings = RatingSerializer(many=True)
-    url = serializers.HyperlinkedIdentityField(view_name="movies:movie-detail")
+    url = IdentityUrlField(view_name="movies:movie-detail")
+    comment_count = serializers.IntegerField(read_only=True)
+    comments_url = serializers.SerializerMethodField()
     comments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     class Meta:
         model = Movie
         # fields = '__all__' + 'url' + 'Ratings'
-        fields = [field.name for field in model._meta.fields]
-        fields.extend(['url', 'Ratings', 'comments'])
+        fields = [field.name for field in model._meta.fields
+                  if field.name not in DERIVED_FIELDS]
+        fields.extend(
+            ['url', 'Ratings', 'comment_count', 'comments_url', 'comments'])
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # IDs of all comments are returned only if requested (?expand=comments)
+        if 'comments' not in self.context.get('expand', ()):
+            self.fields.pop('comments')
+
+    def get_comments_url(self, obj):
+        url = get_url(self.context, 'movies:comments-list')
+        return '{}?movie={}'.format(url, obj.pk)
+
+
+# Primary key of movie - if IDs of existing movies are given in context
+# (many comments are validated at once), the movie isn't fetched
+class MovieField(serializers.PrimaryKeyRelatedField):
+
+    def to_internal_value(self, data):
+        movie_ids = self.context.get('movie_ids')
+        if movie_ids is None:
+            return super().to_internal_value(data)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in movie_ids:
+            self.fail('does_not_exist', pk_value=data)
+        return Movie(pk=pk)
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    url = serializers.HyperlinkedIdentityField('movies:comment-detail')
+    url = IdentityUrlField('movies:comment-detail')
+    movie = MovieField(queryset=Movie.objects.all())
     movie_url = serializers.SerializerMethodField()
 
+    # Url is built from movie_id, so the movie isn't fetched
     def get_movie_url(self, obj):
-        req = self.context.get('request')
-        pk = obj.movie.id
-        url = reverse('movies:movie-detail', args=[pk], request=req)
-        return url
+        build = get_url_builder(self.context, 'movies:movie-detail')
+        return build(obj.movie_id)
 
     class Meta:
         model = Comment
@@ -61,25 +141,32 @@ class TitleSerializer(serializers.ModelSerializer):
         fields = ['Title', ]
 
 
-class TopSerializer(serializers.Serializer):
+# Movies requested in bulk import - by titles and/or imdbIDs
+class BulkImportSerializer(serializers.Serializer):
+    titles = serializers.ListField(
+        child=serializers.CharField(), required=False)
+    imdbIDs = serializers.ListField(
+        child=serializers.CharField(), required=False)
 
-    id = serializers.SerializerMethodField()
-    total_comments = serializers.SerializerMethodField()
-    rank = serializers.SerializerMethodField()
-    movie_url = serializers.SerializerMethodField()
+    def validate(self, attrs):
+        total = len(attrs.get('titles', [])) + len(attrs.get('imdbIDs', []))
+        max_items = self.context['max_items']
+        if not total:
+            raise serializers.ValidationError(
+                'Please provide movie titles or imdbIDs in POST request.')
+        if total > max_items:
+            raise serializers.ValidationError(
+                'Up to {} movies can be imported at once.'.format(max_items))
+        return attrs
 
-    def get_id(self, obj):
-        return obj['movie'].pk
 
-    def get_total_comments(self, obj):
-        return obj['movie'].total_comments
+class TopSerializer(serializers.Serializer):
 
-    def get_rank(self, obj):
-        return obj['rank']
+    id = serializers.IntegerField()
+    total_comments = serializers.IntegerField()
+    rank = serializers.IntegerField()
+    movie_url = serializers.SerializerMethodField()
 
     def get_movie_url(self, obj):
-        request = self.context.get('request')
-        url = reverse(
-            'movies:movie-detail', args=[obj['movie'].pk, ], request=request
-        )
-        return url
+        build = get_url_builder(self.context, 'movies:movie-detail')
+        return build(obj['id'])
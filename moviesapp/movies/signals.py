@@ -0,0 +1,175 @@
+from collections import Counter
+
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from movies import cache, search
+from movies.models import (
+    Comment, CommentDailyCount, FacetCount, Genre, Movie, Rating
+)
+
+# Migration which creates full-text search index
+SEARCH_MIGRATION = '0012_search_index'
+
+# Sent after objects have been saved with bulk_create(), which doesn't send
+# post_save signals
+post_bulk_create = Signal(providing_args=['objects'])
+
+
+@receiver(pre_save, sender=Comment)
+def load_counted_day(sender, instance, raw=False, **kwargs):
+    # Instance hasn't been loaded from DB (e.g. created with known pk),
+    # so take the stored movie and day directly from DB
+    if raw or instance.pk is None or hasattr(instance, '_counted_as'):
+        return
+    instance._counted_as = Comment.objects.filter(pk=instance.pk).values_list(
+        'movie_id', 'created').first()
+
+
+@receiver(post_save, sender=Comment)
+def update_daily_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counted_as = None if created else instance._counted_as
+    current = (instance.movie_id, instance.created)
+    if counted_as == current:
+        return
+    # Comment has been moved to another movie or day
+    if counted_as is not None:
+        CommentDailyCount.add(*counted_as, delta=-1)
+    CommentDailyCount.add(*current, delta=1)
+    instance._counted_as = current
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_daily_count(sender, instance, **kwargs):
+    counted_as = getattr(
+        instance, '_counted_as', (instance.movie_id, instance.created))
+    CommentDailyCount.add(*counted_as, delta=-1)
+
+
+# Comments created with bulk_create() are counted with one update per movie
+# and day
+@receiver(post_bulk_create, sender=Comment)
+def increase_daily_counts(sender, objects, **kwargs):
+    days = Counter((comment.movie_id, comment.created) for comment in objects)
+    for (movie_id, day), delta in days.items():
+        CommentDailyCount.add(movie_id, day, delta)
+    for comment in objects:
+        comment._counted_as = (comment.movie_id, comment.created)
+
+
+@receiver(post_save, sender=Movie)
+def update_genres(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.Genre != getattr(instance, '_saved_genre', None):
+        Genre.assign([instance], created=created)
+
+
+@receiver(post_bulk_create, sender=Movie)
+def set_created_genres(sender, objects, **kwargs):
+    Genre.assign(objects, created=True)
+
+
+@receiver(pre_save, sender=Movie)
+def load_counted_facets(sender, instance, raw=False, **kwargs):
+    # Instance hasn't been loaded from DB with all fields of facets, so take
+    # the stored values directly from DB
+    if raw or instance.pk is None or hasattr(instance, '_counted_facets'):
+        return
+    stored = Movie.objects.filter(pk=instance.pk).only(
+        'Genre', 'Year', 'imdb_rating').first()
+    instance._counted_facets = stored.get_facets() if stored else []
+
+
+@receiver(post_save, sender=Movie)
+def update_facet_counts(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counted = [] if created else instance._counted_facets
+    current = instance.get_facets()
+    if counted != current:
+        FacetCount.move(counted, current)
+    instance._counted_facets = current
+
+
+@receiver(post_delete, sender=Movie)
+def decrease_facet_counts(sender, instance, **kwargs):
+    FacetCount.move(getattr(
+        instance, '_counted_facets', instance.get_facets()), [])
+
+
+@receiver(post_bulk_create, sender=Movie)
+def increase_facet_counts(sender, objects, **kwargs):
+    FacetCount.move([], [
+        facet for movie in objects for facet in movie.get_facets()])
+
+
+# Generation of cached data is bumped again after commit, because data
+# cached by concurrent request during transaction is old
+def invalidate(namespace):
+    cache.bump_generation(namespace)
+    transaction.on_commit(lambda: cache.bump_generation(namespace))
+
+
+# Ranking of top commented movies contains every movie and its comments count
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_bulk_create, sender=Movie)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_bulk_create, sender=Comment)
+def invalidate_top(sender, **kwargs):
+    invalidate('top')
+
+
+# Cached facets of filtered movies
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_bulk_create, sender=Movie)
+def invalidate_facets(sender, **kwargs):
+    invalidate('facets')
+
+
+# Cached total count of rows changes only when rows are added or removed
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_bulk_create, sender=Movie)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_bulk_create, sender=Comment)
+def invalidate_count(sender, created=True, **kwargs):
+    if created:
+        invalidate('count:' + sender._meta.db_table)
+
+
+# Cached responses of movies contain ratings and comments
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_bulk_create, sender=Movie)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+@receiver(post_bulk_create, sender=Rating)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_bulk_create, sender=Comment)
+def invalidate_responses(sender, **kwargs):
+    invalidate('responses')
+
+
+# Full-text search index is created by migration 0012_search_index. After
+# migrate it is created only in databases without migrations of movies (e.g.
+# test databases created with --nomigrations), and SQLite triggers dropped
+# when later migrations rebuild movies table are recreated. Index removed by
+# reversed migration isn't created again.
+def create_search_index(sender, using='default', **kwargs):
+    applied = {
+        name for app, name in MigrationRecorder(
+            connections[using]).applied_migrations()
+        if app == 'movies'
+    }
+    if not applied or SEARCH_MIGRATION in applied:
+        search.create_index(using)
@@ -0,0 +1,10 @@
+import pytest
+from django.core.cache import cache
+
+
+# Cached data is kept between tests, while DB is rolled back
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
@@ -0,0 +1,79 @@
+import json
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+
+from movies import omdb
+
+
+# Data of the movie in the same format as OMDb returns
+def omdb_payload(title, **fields):
+    data = {
+        'Title': title, 'Year': '2018', 'Rated': 'PG-13',
+        'Released': '14 Dec 2018', 'Runtime': '100 min',
+        'Genre': 'Documentary, Adventure, Sport',
+        'Director': 'Jimmy Chin, Elizabeth Chai Vasarhelyi',
+        'Writer': 'N/A', 'Actors': 'Alex Honnold, Tommy Caldwell',
+        'Plot': 'Alex Honnold attempts to free solo climb El Capitan.',
+        'Language': 'English', 'Country': 'USA', 'Awards': 'Won 1 Oscar.',
+        'Poster': 'https://example.com/poster.jpg',
+        'Ratings': [{'Source': 'Internet Movie Database', 'Value': '8.2/10'}],
+        'Metascore': '83', 'imdbRating': '8.2', 'imdbVotes': '48,218',
+        'imdbID': 'tt7775622', 'Type': 'movie', 'DVD': '05 Mar 2019',
+        'BoxOffice': '$17,540,442', 'Production': 'National Geographic',
+        'Website': 'N/A', 'Response': 'True',
+    }
+    data.update(fields)
+    return data
+
+
+NOT_FOUND = {'Response': 'False', 'Error': 'Movie not found!'}
+
+
+# Transport adapter which answers OMDb requests without network - movies are
+# found by title or imdbID, responses can be also queued as (status code,
+# data or error)
+class StubAdapter(BaseAdapter):
+
+    def __init__(self, movies=(), responses=()):
+        super().__init__()
+        self.movies = {movie['Title'].lower(): movie for movie in movies}
+        self.movies.update({movie['imdbID']: movie for movie in movies})
+        self.responses = list(responses)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        if self.responses:
+            status_code, data = self.responses.pop(0)
+            if isinstance(data, Exception):
+                raise data
+        else:
+            params = parse_qs(urlparse(request.url).query)
+            if 'i' in params:
+                key = params['i'][0]
+            else:
+                key = params.get('t', [''])[0].lower()
+            status_code = 200
+            data = self.movies.get(key, NOT_FOUND)
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(data).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def stub_client(*movies, responses=(), **kwargs):
+    kwargs.setdefault('backoff_factor', 0)
+    kwargs.setdefault('cache_dir', None)
+    client = omdb.OMDbClient(**kwargs)
+    client.adapter = StubAdapter(movies, responses)
+    client.session.mount('http://', client.adapter)
+    client.session.mount('https://', client.adapter)
+    return client
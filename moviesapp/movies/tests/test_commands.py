@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from mixer.backend.django import mixer
+from rest_framework.test import APITestCase
+
+from movies import cache, models
+from movies.management.commands.import_omdb_dump import iter_json_array
+from movies.tests.stubs import omdb_payload
+
+
+class TestRebuildCommentCounts(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie')
+        mixer.cycle(3).blend('movies.Comment', movie=self.movie)
+
+    def test_rebuild(self):
+        models.CommentDailyCount.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_comment_counts', stdout=out)
+        count = models.CommentDailyCount.objects.get(movie=self.movie)
+        assert count.count == 3
+        assert 'match comments' in out.getvalue()
+
+    # Rankings and responses cached before the rebuild aren't served
+    def test_rebuild_invalidates_cache(self):
+        generations = [cache.get_generation(namespace)
+                       for namespace in ('top', 'responses')]
+        call_command('rebuild_comment_counts', stdout=StringIO())
+        assert all(cache.get_generation(namespace) > generation
+                   for namespace, generation in zip(('top', 'responses'),
+                                                    generations))
+
+    def test_check_mismatch(self):
+        models.CommentDailyCount.objects.update(count=5)
+        with pytest.raises(CommandError):
+            call_command('rebuild_comment_counts', '--check',
+                         stdout=StringIO(), stderr=StringIO())
+
+
+class TestBackfillTypedFields(APITestCase):
+
+    def test_backfill(self):
+        mixer.cycle(3).blend('movies.Movie', imdbVotes='1,000', Runtime='N/A')
+        models.Movie.objects.update(imdb_votes=None, runtime_minutes=7)
+        out = StringIO()
+        call_command('backfill_typed_fields', '--batch-size', '2', stdout=out)
+        assert list(models.Movie.objects.values_list(
+            'imdb_votes', 'runtime_minutes').distinct()) == [(1000, None)]
+        assert 'Typed fields of 3 movies' in out.getvalue()
+
+    # Time of the change is set and cached results are invalidated
+    def test_backfill_invalidates_cache(self):
+        movie = mixer.blend('movies.Movie', imdbRating='7.5')
+        models.Movie.objects.update(imdb_rating=None)
+        generations = [cache.get_generation(namespace)
+                       for namespace in ('facets', 'responses')]
+        call_command('backfill_typed_fields', stdout=StringIO())
+        assert models.Movie.objects.get(pk=movie.pk).updated > movie.updated
+        assert all(cache.get_generation(namespace) > generation
+                   for namespace, generation in zip(('facets', 'responses'),
+                                                    generations))
+
+
+class TestImportOmdbDump(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie', imdbID='tt2545428')
+        self.records = [
+            omdb_payload('Free Solo'),
+            omdb_payload('Meru', imdbID='tt2545428'),
+            omdb_payload('Free Solo'),
+            {'Response': 'False', 'Error': 'Movie not found!'},
+            omdb_payload('Valley Uprising', imdbID='tt3784160', Year='N/A'),
+            omdb_payload('The Dawn Wall', imdbID='tt7286966'),
+        ]
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as fp:
+            fp.write(content)
+        return path
+
+    def assert_imported(self, out):
+        assert set(models.Movie.objects.values_list('Title', flat=True)) == {
+            self.movie.Title, 'Free Solo', 'The Dawn Wall'
+        }
+        assert models.Rating.objects.filter(
+            Movie__Title='The Dawn Wall').count() == 1
+        assert set(models.Movie.objects.get(
+            Title='Free Solo').genres.values_list('name', flat=True)) == {
+            'Documentary', 'Adventure', 'Sport'}
+        assert ('Read 6, imported 2, skipped 2, invalid 2 records'
+                in out.getvalue())
+
+    def test_import_json_lines(self):
+        path = self.write('dump.jsonl', '\n'.join(
+            json.dumps(record) for record in self.records))
+        out = StringIO()
+        call_command('import_omdb_dump', path, '--chunk-size', '2',
+                     stdout=out)
+        self.assert_imported(out)
+
+    def test_import_json_array(self):
+        path = self.write('dump.json', json.dumps(self.records, indent=2))
+        out = StringIO()
+        call_command('import_omdb_dump', path, stdout=out)
+        self.assert_imported(out)
+
+    # Genres and facets are saved in the same transaction as movies
+    def test_import_chunk_atomic(self):
+        path = self.write('dump.json', json.dumps(self.records))
+        with mock.patch('movies.models.Genre.assign',
+                        side_effect=RuntimeError), \
+                pytest.raises(RuntimeError):
+            call_command('import_omdb_dump', path, stdout=StringIO())
+        assert list(models.Movie.objects.all()) == [self.movie]
+
+    def test_import_invalid_file(self):
+        path = self.write('dump.json', '[{"Title": ')
+        with pytest.raises(CommandError):
+            call_command('import_omdb_dump', path, stdout=StringIO())
+
+    def test_iter_json_array_small_buffer(self):
+        content = json.dumps(self.records)
+        path = self.write('dump.json', content)
+        with open(path) as fp:
+            assert list(iter_json_array(fp, buffer_size=7)) == self.records
+
+
+class TestBenchmarkSerialization(APITestCase):
+
+    def test_same_output_and_sample_removed(self):
+        out = StringIO()
+        call_command('benchmark_serialization', '--sample', '20',
+                     '--requests', '1', stdout=out)
+        lines = out.getvalue().splitlines()
+        assert [line.split()[0] for line in lines] == [
+            'movies', 'comments', 'top']
+        assert all(line.endswith('same output: True') for line in lines)
+        assert not models.Movie.objects.exists()
+
+    # Rolled back sample isn't cached in the configured cache
+    def test_configured_cache_not_used(self):
+        stats = cache.get_stats()
+        generation = cache.get_generation('top')
+        call_command('benchmark_serialization', '--sample', '5',
+                     '--requests', '1', stdout=StringIO())
+        assert cache.get_stats() == stats
+        assert cache.get_generation('top') == generation
@@ -0,0 +1,91 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from movies import locks
+from movies.locks import KeyedLock
+from movies.models import ImportLock
+
+
+def test_keyed_lock_serializes_same_key():
+    lock = KeyedLock()
+    running = []
+    overlaps = []
+
+    def work(key):
+        with lock(key):
+            running.append(key)
+            overlaps.append(running.count(key))
+            time.sleep(0.01)
+            running.remove(key)
+
+    threads = [
+        threading.Thread(target=work, args=(key,))
+        for key in ('free solo', 'free solo', 'free solo', 'meru')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
+    assert len(lock) == 0, 'Unused locks should be removed.'
+
+
+def test_keyed_lock_other_keys_not_blocked():
+    lock = KeyedLock()
+    with lock('free solo'):
+        acquired = threading.Event()
+
+        def work():
+            with lock('meru'):
+                acquired.set()
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        assert acquired.wait(1)
+        thread.join()
+
+
+# Outcome recorded by the holder is read by request from other process, the
+# row is removed when it expires
+@pytest.mark.django_db
+def test_import_lock_outcome():
+    with locks.import_lock('the matrix') as lease:
+        assert lease.outcome is None
+        lease.record('tt0133093')
+    lock = ImportLock.objects.get()
+    assert lock.result == 'tt0133093'
+    assert locks.acquire(lock.key).outcome == 'tt0133093'
+
+    with mock.patch('movies.locks.timezone.now', return_value=(
+            timezone.now() + timedelta(seconds=61))):
+        with locks.import_lock('meru') as lease:
+            assert lease.outcome is None
+    assert not ImportLock.objects.exists()
+
+
+# Lock without outcome is removed at once, expired lease of other process
+# is taken over
+@pytest.mark.django_db
+def test_import_lock_released():
+    with locks.import_lock('free solo') as lease:
+        assert ImportLock.objects.get().result is None
+    assert not ImportLock.objects.exists()
+
+    lock = ImportLock.objects.create(key='abc', expires=timezone.now())
+    lease = locks.acquire('abc')
+    assert lease.lock.pk != lock.pk and lease.outcome is None
+
+
+# Outcome recorded before the import failed isn't kept for other requests
+@pytest.mark.django_db
+def test_import_lock_failed():
+    with pytest.raises(RuntimeError):
+        with locks.import_lock('free solo') as lease:
+            lease.record('tt7775622')
+            raise RuntimeError
+    assert not ImportLock.objects.exists()
@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+
+from movies import middleware
+from movies.middleware import CompressionMiddleware, negotiate_encoding
+
+CONTENT = b'{"results":[' + b','.join([b'{"Title":"Free Solo"}'] * 50) + b']}'
+
+
+def get_response(encoding, response=None):
+    request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=encoding)
+    if response is None:
+        response = HttpResponse(CONTENT, content_type='application/json')
+        response['ETag'] = '"abc"'
+    return CompressionMiddleware().process_response(request, response)
+
+
+@pytest.mark.parametrize('header, encoding', [
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('gzip;q=0, br;q=0', None),
+    ('*', 'br'),
+    ('*;q=0.1, br;q=0', 'gzip'),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiate_encoding(header, encoding):
+    if middleware.brotli is None and encoding == 'br':
+        encoding = 'gzip'
+    assert negotiate_encoding(header) == encoding
+
+
+def test_gzip_response():
+    response = get_response('gzip')
+    assert response['Content-Encoding'] == 'gzip'
+    assert response['Vary'] == 'Accept-Encoding'
+    assert response['ETag'] == 'W/"abc"'
+    assert gzip.decompress(response.content) == CONTENT
+
+
+def test_brotli_response():
+    brotli = pytest.importorskip('brotli')
+    response = get_response('gzip, br')
+    assert response['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.content) == CONTENT
+
+    streamed = StreamingHttpResponse(iter([CONTENT[:100], CONTENT[100:]]))
+    response = get_response('br', streamed)
+    assert response['Content-Encoding'] == 'br'
+    assert brotli.decompress(b''.join(response.streaming_content)) == CONTENT
+
+
+# Streamed items aren't compressed as separate blocks
+def test_brotli_streamed_items():
+    brotli = pytest.importorskip('brotli')
+    items = [b'{"Title":"Free Solo"},'] * 500
+    response = get_response('br', StreamingHttpResponse(iter(items)))
+    content = b''.join(response.streaming_content)
+    assert brotli.decompress(content) == b''.join(items)
+    assert len(content) < len(brotli.compress(items[0])) * 10
+
+
+def test_not_compressed():
+    response = get_response('gzip;q=0')
+    assert not response.has_header('Content-Encoding')
+    assert response['Vary'] == 'Accept-Encoding'
+    assert response.content == CONTENT
+
+    response = get_response('gzip', HttpResponse(b'{}'))
+    assert not response.has_header('Content-Encoding')
@@ -1,8 +1,13 @@
+from datetime import date
+from decimal import Decimal
+
 import pytest
 from django.urls import reverse
 from mixer.backend.django import mixer
 from rest_framework.test import APIRequestFactory, APITestCase
 
+from movies import models
+
 pytestmark = pytest.mark.django_db
 
 
@@ -27,6 +32,39 @@ class TestMovie(APITestCase):
         assert result == url
 
 
+class TestMovieTypedFields(APITestCase):
+
+    def test_parsers(self):
+        assert models.parse_rating('7.8') == Decimal('7.8')
+        assert models.parse_int('1,234,567') == 1234567
+        assert models.parse_small_int('142 min') == 142
+        assert models.parse_big_int('$17,540,442') == 17540442
+        assert models.parse_date('14 Dec 2018') == date(2018, 12, 14)
+        for parse in (models.parse_rating, models.parse_int,
+                      models.parse_small_int, models.parse_date):
+            assert parse('N/A') is None
+            assert parse('') is None
+        assert models.parse_small_int('99999 min') is None
+
+    def test_set_on_save(self):
+        movie = mixer.blend(
+            'movies.Movie', imdbRating='8.2', imdbVotes='48,218',
+            Metascore='N/A', Runtime='100 min', BoxOffice='$17,540,442',
+            Released='14 Dec 2018')
+        movie.refresh_from_db()
+        assert movie.imdb_rating == Decimal('8.2')
+        assert movie.imdb_votes == 48218
+        assert movie.meta_score is None
+        assert movie.runtime_minutes == 100
+        assert movie.box_office == 17540442
+        assert movie.released_date == date(2018, 12, 14)
+
+        movie.imdbRating = '8.3'
+        movie.save(update_fields=['imdbRating'])
+        movie.refresh_from_db()
+        assert movie.imdb_rating == Decimal('8.3')
+
+
 class TestRating(APITestCase):
 
     def setUp(self):
@@ -47,3 +85,35 @@ class TestComment(APITestCase):
         result = self.comment.__str__()
         assert result == 'Comment by {} - movie {}'.format(
             self.comment.user, self.comment.movie.Title)
+
+
+class TestCommentDailyCount(APITestCase):
+
+    def setUp(self):
+        self.movie_1 = mixer.blend('movies.Movie')
+        self.movie_2 = mixer.blend('movies.Movie')
+        self.comment = mixer.blend('movies.Comment', movie=self.movie_1)
+
+    @staticmethod
+    def counts():
+        return dict(models.CommentDailyCount.objects.values_list(
+            'movie_id', 'count'))
+
+    def test_comment_created(self):
+        mixer.blend('movies.Comment', movie=self.movie_1)
+        assert self.counts() == {self.movie_1.pk: 2}
+
+    def test_comment_moved(self):
+        comment = models.Comment.objects.get(pk=self.comment.pk)
+        comment.movie = self.movie_2
+        comment.save()
+        assert self.counts() == {self.movie_1.pk: 0, self.movie_2.pk: 1}
+
+    def test_comment_updated_in_place(self):
+        self.comment.comment = 'Updated comment.'
+        self.comment.save()
+        assert self.counts() == {self.movie_1.pk: 1}
+
+    def test_comment_deleted(self):
+        models.Comment.objects.get(pk=self.comment.pk).delete()
+        assert self.counts() == {self.movie_1.pk: 0}
@@ -0,0 +1,132 @@
+import tempfile
+from io import StringIO
+from unittest import mock
+
+import pytest
+import requests
+from django.core.management import call_command
+
+from movies import omdb
+from movies.cache import get_stats
+from movies.tests.stubs import NOT_FOUND, omdb_payload, stub_client
+
+
+def test_normalize_title():
+    assert omdb.normalize_title('  Free   SOLO ') == 'free solo'
+
+
+def test_ttl_cache_drops_least_recently_used():
+    cache = omdb.TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_ttl_cache_expires():
+    cache = omdb.TTLCache(maxsize=2, ttl=60)
+    with mock.patch('movies.omdb.time.monotonic', return_value=0):
+        cache.set('a', 1)
+    with mock.patch('movies.omdb.time.monotonic', return_value=61):
+        assert cache.get('a') is None
+
+
+def test_get_movie_encodes_title():
+    client = stub_client(omdb_payload('Tom & Jerry'))
+    data = client.get_movie('Tom & Jerry')
+    assert data['Title'] == 'Tom & Jerry'
+    assert 't=Tom+%26+Jerry' in client.adapter.requests[0].url
+
+
+def test_get_movie_cached_by_normalized_title():
+    client = stub_client(omdb_payload('Free Solo'))
+    client.get_movie('Free Solo')
+    data = client.get_movie(' free  solo')
+    assert data['Title'] == 'Free Solo'
+    assert len(client.adapter.requests) == 1
+
+
+def test_get_movie_not_found():
+    client = stub_client()
+    assert client.get_movie('Unknown') == NOT_FOUND
+
+
+def test_get_movie_retries():
+    client = stub_client(responses=[
+        (503, {}),
+        (200, requests.ConnectionError()),
+        (200, omdb_payload('Free Solo')),
+    ])
+    assert client.get_movie('Free Solo')['Title'] == 'Free Solo'
+    assert len(client.adapter.requests) == 3
+
+
+def test_get_movie_retries_exhausted():
+    client = stub_client(retries=1, responses=[(502, {}), (502, {})])
+    with pytest.raises(omdb.OMDbError):
+        client.get_movie('Free Solo')
+
+
+def test_get_movie_disk_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = stub_client(omdb_payload('Free Solo'), cache_dir=cache_dir)
+        client.get_movie('Free Solo')
+        # New client (e.g. after restart) reads data from the disk
+        restarted = stub_client(cache_dir=cache_dir)
+        assert restarted.get_movie('Free Solo')['Title'] == 'Free Solo'
+        assert restarted.adapter.requests == []
+
+
+def test_get_movie_not_found_cached():
+    client = stub_client()
+    client.get_movie('Unknown')
+    assert client.get_movie(' UNKNOWN') == NOT_FOUND
+    assert len(client.adapter.requests) == 1
+    assert get_stats()['omdb_negative'] == {'hits': 1, 'misses': 1}
+
+
+def test_get_movie_error_answer_cached():
+    client = stub_client(responses=[(401, {'Response': 'False',
+                                           'Error': 'Invalid API key!'})])
+    client.get_movie('Free Solo')
+    assert client.get_movie('Free Solo')['Error'] == 'Invalid API key!'
+    assert len(client.adapter.requests) == 1
+
+
+def test_get_movie_not_found_expires():
+    client = stub_client(negative_cache_ttl=60)
+    with mock.patch('movies.omdb.time.monotonic', return_value=0):
+        client.get_movie('Unknown')
+    with mock.patch('movies.omdb.time.monotonic', return_value=61):
+        client.get_movie('Unknown')
+    assert len(client.adapter.requests) == 2
+
+
+def test_purge_omdb_cache_command():
+    client = stub_client(omdb_payload('Free Solo'))
+    client.get_movie('Unknown')
+    client.get_movie('Free Solo')
+    with mock.patch('movies.omdb.get_client', return_value=client):
+        call_command('purge_omdb_cache', stdout=StringIO())
+    client.get_movie('Unknown')
+    client.get_movie('Free Solo')
+    assert len(client.adapter.requests) == 3
+
+
+# Memory caches are keyed with generation, so purge made by other process
+# sharing the cache backend applies to them
+def test_purge_from_other_process():
+    client = stub_client(omdb_payload('Free Solo'))
+    client.get_movie('Unknown')
+    client.get_movie('Free Solo')
+    other = stub_client()
+    out = StringIO()
+    with mock.patch('movies.omdb.get_client', return_value=other):
+        call_command('purge_omdb_cache', '--all', stdout=out)
+    assert 'running servers have not been purged' in out.getvalue()
+    client.get_movie('Unknown')
+    client.get_movie('Free Solo')
+    assert len(client.adapter.requests) == 4
@@ -0,0 +1,138 @@
+import re
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from movies import views
+from movies.models import Comment, Movie, Rating
+from movies.signals import post_bulk_create
+
+GENRES = ('Drama', 'Comedy', 'Action', 'Documentary', 'Horror', 'Sport',
+          'Romance', 'Thriller', 'Animation', 'Western')
+
+# Filters and orderings of list endpoints, every query they run has to read
+# tables through indexes. Filters with icontains (Title, Genre) can't use
+# an index, full-text search is used instead of them.
+CASES = (
+    (views.MoviesList, {}),
+    (views.MoviesList, {'page': 3}),
+    (views.MoviesList, {'Year': 1999}),
+    (views.MoviesList, {'Year__gt': 2015, 'ordering': 'Year'}),
+    (views.MoviesList, {'Year__lte': 1955, 'ordering': '-Title'}),
+    (views.MoviesList, {'ordering': 'Title'}),
+    (views.MoviesList, {'ordering': '-Year', 'pagination': 'cursor'}),
+    (views.MoviesList, {'imdbRating__gte': 9.5}),
+    (views.MoviesList, {'genre': ['Drama', 'Sport']}),
+    (views.MoviesList, {'genre': 'Western', 'genre_match': 'any'}),
+    (views.MoviesList, {'search': 'movie 42'}),
+    (views.MoviesList, {'expand': 'comments'}),
+    (views.CommentsList, {}),
+    (views.CommentsList, {'page': 5}),
+    (views.CommentsList, {'movie': 7}),
+    (views.CommentsList, {'user': 'user3', 'ordering': '-created'}),
+    (views.CommentsList, {'ordering': 'movie'}),
+    (views.CommentsList, {'pagination': 'cursor', 'ordering': 'user'}),
+    (views.TopList, {}),
+    (views.TopList, {'since': '2019-01-01', 'limit': 10}),
+)
+
+# Steps of plans which read whole table - "SCAN table" in SQLite (without
+# "USING INDEX"), "Seq Scan on table" in PostgreSQL
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Rows read in primary key order are a scan of SQLite table, which stops at
+# LIMIT - it is used only if rows aren't sorted again
+PK_ORDER = 'ORDER BY "{}"."id" (ASC|DESC)'
+
+
+# Tables read with full scan by the query
+def get_full_scans(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql)
+            return [
+                match.group(1) for row in cursor.fetchall()
+                for match in [POSTGRESQL_SCAN.search(row[0])] if match
+            ]
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        plan = [row[-1] for row in cursor.fetchall()]
+    tables = set(connection.introspection.table_names())
+    scans = []
+    for step in plan:
+        match = SQLITE_SCAN.match(step)
+        # Aliases of tables in subqueries are U0, U1...
+        if not match or not (match.group(1) in tables or
+                             re.match(r'U\d+$', match.group(1))):
+            continue
+        table = match.group(1)
+        if (re.search(PK_ORDER.format(table), sql) and ' LIMIT ' in sql and
+                'USE TEMP B-TREE FOR ORDER BY' not in plan):
+            continue
+        scans.append(table)
+    return scans
+
+
+class TestListQueryPlans(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        movies = [
+            Movie(Title='Movie {}'.format(number), Year=1950 + number % 70,
+                  imdbID='tt{:07d}'.format(number),
+                  Genre='{}, {}'.format(GENRES[number % 10],
+                                        GENRES[number * 3 % 10]),
+                  imdbRating='{:.1f}'.format(number % 100 / 10))
+            for number in range(400)
+        ]
+        for movie in movies:
+            movie.set_typed_fields()
+        Movie.objects.bulk_create(movies)
+        movies = list(Movie.objects.all())
+        post_bulk_create.send(sender=Movie, objects=movies)
+        Rating.objects.bulk_create(
+            Rating(Movie=movie, Source='Internet Movie Database',
+                   Value='7/10') for movie in movies)
+        comments = Comment.objects.bulk_create(
+            Comment(movie=movie, user='user{}'.format(number % 50),
+                    comment='Comment.')
+            for number, movie in enumerate(movies * 3))
+        post_bulk_create.send(sender=Comment, objects=comments)
+        call_command('rebuild_comment_counts', stdout=StringIO())
+        # Statistics of seeded tables are used by query planner
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Small tables are scanned even if an index can be used
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def run_view(self, view, params):
+        with CaptureQueriesContext(connection) as queries:
+            resp = view.as_view()(APIRequestFactory().get('/', params))
+            if resp.streaming:
+                b''.join(resp.streaming_content)
+        assert resp.status_code == 200, (view, params, resp.data)
+        return [query['sql'] for query in queries]
+
+    def test_list_endpoints_use_indexes(self):
+        failures = []
+        for view, params in CASES:
+            for sql in self.run_view(view, params):
+                scans = get_full_scans(sql)
+                if scans:
+                    failures.append('{} {} - full scan of {}:\n{}'.format(
+                        view.__name__, params, ', '.join(scans), sql))
+        assert not failures, '\n\n'.join(failures)
+
+    def test_full_scan_detected(self):
+        assert get_full_scans(
+            'SELECT * FROM movies_comment WHERE comment = \'x\'') == [
+            'movies_comment']
+        assert get_full_scans(
+            'SELECT * FROM movies_comment WHERE "user" = \'user1\' '
+            'ORDER BY created') == []
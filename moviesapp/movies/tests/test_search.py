@@ -0,0 +1,95 @@
+from unittest import mock
+
+import pytest
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from movies import signals, views
+from movies.models import Movie
+from movies.search import search
+
+
+class TestSearch(APITestCase):
+
+    def setUp(self):
+        self.climbing = mixer.blend(
+            'movies.Movie', Title='Free Solo', Genre='Documentary, Sport',
+            Plot='Alex Honnold climbs El Capitan without a rope.',
+            Actors='Alex Honnold', Director='Jimmy Chin')
+        self.plot = mixer.blend(
+            'movies.Movie', Title='Valley Uprising', Genre='Documentary',
+            Plot='History of climbing in Yosemite, including solo ascents.',
+            Actors='Peter Croft', Director='Peter Mortimer')
+        self.other = mixer.blend(
+            'movies.Movie', Title='Drama', Genre='Drama', Plot='Nothing.',
+            Actors='Someone', Director='Someone Else')
+        self.url = reverse('movies:movies-list')
+
+    def ids(self, text):
+        return list(search(Movie.objects.all(), text).order_by(
+            '-search_rank', 'pk').values_list('pk', flat=True))
+
+    def test_ranked_by_relevance(self):
+        # Title match is ranked higher than plot match
+        assert self.ids('solo') == [self.climbing.pk, self.plot.pk]
+        assert self.ids('climbing history') == [self.plot.pk]
+        # Words are stemmed
+        assert self.ids('climbing documentary') == [
+            self.plot.pk, self.climbing.pk]
+        assert self.ids('Honnold') == [self.climbing.pk]
+
+    def test_special_characters(self):
+        assert self.ids('"solo" -(*:') == [self.climbing.pk, self.plot.pk]
+        assert self.ids('!!!') == []
+
+    def test_index_updated_on_write(self):
+        self.other.Plot = 'Solo sailing around the world.'
+        self.other.save()
+        assert self.other.pk in self.ids('sailing')
+        self.climbing.delete()
+        assert set(self.ids('solo')) == {self.plot.pk, self.other.pk}
+        movie = Movie(**{
+            field.name: 'Sailing' for field in Movie._meta.concrete_fields
+            if field.get_internal_type() in ('CharField', 'TextField')
+        }, Year=2000)
+        Movie.objects.bulk_create([movie])
+        assert len(self.ids('sailing')) == 2
+
+    def test_MovieList_search(self):
+        req = APIRequestFactory().get(self.url, {'search': 'solo'})
+        resp = views.MoviesList.as_view()(req)
+        assert [movie['id'] for movie in resp.data['results']] == [
+            self.climbing.pk, self.plot.pk]
+
+    def test_MovieList_search_ordering_and_cursor(self):
+        req = APIRequestFactory().get(
+            self.url, {'search': 'solo', 'ordering': '-Title'})
+        resp = views.MoviesList.as_view()(req)
+        assert [movie['id'] for movie in resp.data['results']] == [
+            self.plot.pk, self.climbing.pk]
+
+        req = APIRequestFactory().get(self.url, {
+            'search': 'solo', 'pagination': 'cursor', 'page_size': 1})
+        first = views.MoviesList.as_view()(req).data
+        req = APIRequestFactory().get(first['next'])
+        second = views.MoviesList.as_view()(req).data
+        assert first['results'][0]['id'] == self.climbing.pk
+        assert second['results'][0]['id'] == self.plot.pk
+        assert second['next'] is None
+
+
+# After migrate the index is created only in databases without migrations,
+# or when the migration which creates it is applied
+@pytest.mark.parametrize('applied, created', [
+    (set(), True),
+    ({('movies', '0011_import_lock_lease')}, False),
+    ({('movies', '0011_import_lock_lease'),
+      ('movies', '0012_search_index')}, True),
+])
+def test_create_search_index_fallback(applied, created):
+    with mock.patch.object(signals.MigrationRecorder, 'applied_migrations',
+                           return_value=applied), \
+            mock.patch('movies.search.create_index') as create_index:
+        signals.create_search_index(sender=None)
+    assert create_index.called is created
@@ -0,0 +1,85 @@
+from unittest import mock
+
+import pytest
+from django.db import DatabaseError
+from django.urls import reverse
+from mixer.backend.django import mixer
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from movies import models
+from movies import rows
+from movies.serializers import (
+    CommentSerializer, MovieSerializer, MovieSerializerSave, TopSerializer
+)
+from movies.tests.stubs import omdb_payload
+
+
+class TestMovieSerializerSave(APITestCase):
+
+    def setUp(self):
+        self.data = omdb_payload('Free Solo', Ratings=[
+            {'Source': 'Internet Movie Database', 'Value': '8.2/10'},
+            {'Source': 'Rotten Tomatoes', 'Value': '97%'},
+            {'Source': 'Metacritic', 'Value': '83/100'},
+        ])
+
+    def test_create_queries(self):
+        serializer = MovieSerializerSave(data=self.data)
+        assert serializer.is_valid()
+        for name in ('Documentary', 'Adventure', 'Sport'):
+            models.Genre.objects.create(name=name)
+        # Savepoint, movie insert, genres select, genres links insert, facet
+        # counts insert and update, ratings insert, savepoint release
+        with self.assertNumQueries(8):
+            movie = serializer.save()
+        assert movie.Ratings.count() == 3
+        assert movie.genres.count() == 3
+
+    def test_create_atomic(self):
+        serializer = MovieSerializerSave(data=self.data)
+        assert serializer.is_valid()
+        with mock.patch.object(models.Rating.objects, 'bulk_create',
+                               side_effect=DatabaseError):
+            with pytest.raises(DatabaseError):
+                serializer.save()
+        assert not models.Movie.objects.filter(Title='Free Solo').exists()
+
+
+# Urls are built from templates reversed once per request
+class TestSerializerUrls(APITestCase):
+
+    def setUp(self):
+        self.movies = mixer.cycle(4).blend('movies.Movie')
+        for movie in self.movies:
+            mixer.cycle(25).blend('movies.Comment', movie=movie)
+        self.request = APIRequestFactory().get('/')
+
+    def test_comments_page(self):
+        comments = models.Comment.objects.order_by('pk')
+        with mock.patch.object(rows, 'reverse', wraps=rows.reverse) as rev:
+            with self.assertNumQueries(1):
+                data = CommentSerializer(
+                    comments, many=True,
+                    context={'request': self.request}).data
+        assert len(data) == 100
+        assert rev.call_count == 2
+        comment = comments[0]
+        assert data[0]['url'] == self.request.build_absolute_uri(
+            reverse('movies:comment-detail', args=[comment.pk]))
+        assert data[0]['movie_url'] == self.request.build_absolute_uri(
+            comment.movie.get_absolute_url())
+
+    def test_movies_and_top(self):
+        data = MovieSerializer(
+            models.Movie.objects.prefetch_related('Ratings'), many=True,
+            context={'request': self.request}).data
+        movie = self.movies[1]
+        assert data[1]['url'] == self.request.build_absolute_uri(
+            movie.get_absolute_url())
+        assert data[1]['comments_url'] == self.request.build_absolute_uri(
+            '{}?movie={}'.format(reverse('movies:comments-list'), movie.pk))
+
+        data = TopSerializer(
+            [{'id': movie.pk, 'total_comments': 25, 'rank': 1}], many=True,
+            context={}).data
+        assert data[0]['movie_url'] == movie.get_absolute_url()
@@ -1,12 +1,28 @@
+import datetime
+import hashlib
+import json
+
 import pytest
 import requests
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from mixer.backend.django import mixer
-from rest_framework.test import APIRequestFactory, APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (
+    APIRequestFactory, APITestCase, force_authenticate
+)
 from unittest import mock
 
+from movies import cache
+from movies import facets
+from movies import omdb
 from movies import views
 from movies import models
+from movies.renderers import FastJSONRenderer
+from movies.tests.stubs import omdb_payload, stub_client
 
 
 class TestIndexView(APITestCase):
@@ -33,16 +49,21 @@ class TestMoviesList(APITestCase):
         self.movie_2 = mixer.blend('movies.Movie')
         self.title = 'Free Solo'
         self.url = reverse('movies:movies-list')
+        # OMDb requests are answered by stub transport adapter
+        self.omdb = stub_client(
+            omdb_payload(self.title),
+            omdb_payload(self.movie_1.Title, imdbID='tt7286966'),
+        )
+        patcher = mock.patch('movies.omdb.get_client', return_value=self.omdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     # Data from OMDb which cannot be serialized -
     # some of required fields are empty
     # post method - 'Problem with serializing data from OMDb.'
     @staticmethod
     def omdb_response_data():
-        omdb_response = requests.models.Response()
-        omdb_response.status_code = 200
-        omdb_response._content = b'{ "Title" : "Django", "Response": "True" }'
-        return omdb_response
+        return {'Title': 'Django', 'Response': 'True'}
 
     # Test post request - different conditions
     def test_MovieList_post_valid_request(self):
@@ -84,6 +105,31 @@ class TestMoviesList(APITestCase):
         assert resp.status_code == 204
         assert resp.data == expected_response
 
+    # Title already saved is found in DB without request to OMDb
+    def test_MovieList_post_saved_title_other_case(self):
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        views.MoviesList.as_view()(req)
+        req = APIRequestFactory().post(self.url, {'Title': 'FREE SOLO'})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 204
+        assert resp.data == {
+            'Warning': '{} already exists in database.'.format(self.title)
+        }
+        assert len(self.omdb.adapter.requests) == 1
+        assert models.Movie.objects.filter(Title=self.title).count() == 1
+
+    # Movie with the same imdbID is saved under other title
+    def test_MovieList_post_movie_imdbID_in_db(self):
+        mixer.blend('movies.Movie', Title='Free Solo (2018)',
+                    imdbID=omdb_payload(self.title)['imdbID'])
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 204
+        assert resp.data == {
+            'Warning': '{} already exists in database.'.format(self.title)
+        }
+        assert not models.Movie.objects.filter(Title=self.title).exists()
+
     # The request for movie which is not present in OMDb api
     def test_MovieList_post_movie_not_exists_omdb(self):
         req = APIRequestFactory().post(self.url,
@@ -110,6 +156,59 @@ class TestMoviesList(APITestCase):
         assert resp.status_code == 500
         assert resp.data == expected_response
 
+    # Request waiting for concurrent import of the title (e.g. in other
+    # process) uses its outcome without request to OMDb
+    def test_MovieList_post_imported_by_other_request(self):
+        for title, outcome in (('dawn wall', self.movie_1.imdbID),
+                               (self.title, '')):
+            models.ImportLock.objects.create(
+                key=hashlib.sha1(omdb.normalize_title(title).encode(
+                    'utf-8')).hexdigest(),
+                expires=timezone.now() + datetime.timedelta(seconds=60),
+                result=outcome)
+        req = APIRequestFactory().post(self.url, {'Title': 'dawn wall'})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 204
+        assert resp.data == {
+            'Warning': '{} already exists in database.'.format(
+                self.movie_1.Title)}
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.data == {
+            'Error': 'Movie with that title has not been found.'}
+        assert self.omdb.adapter.requests == []
+
+    # Outcome of the import is recorded for waiting requests
+    def test_MovieList_post_records_outcome(self):
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        views.MoviesList.as_view()(req)
+        req = APIRequestFactory().post(self.url, {'Title': 'Unknown'})
+        views.MoviesList.as_view()(req)
+        assert sorted(models.ImportLock.objects.values_list(
+            'result', flat=True)) == ['', omdb_payload(self.title)['imdbID']]
+
+    # Outcome isn't recorded when the movie hasn't been saved
+    def test_MovieList_post_failed_save_not_recorded(self):
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        with mock.patch('movies.views.MovieSerializerSave.save',
+                        side_effect=RuntimeError), \
+                pytest.raises(RuntimeError):
+            views.MoviesList.as_view()(req)
+        with mock.patch('movies.views.MovieSerializerSave.is_valid',
+                        return_value=False):
+            resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 500
+        assert not models.ImportLock.objects.exists()
+
+    # OMDb can't be reached
+    def test_MovieList_post_omdb_unavailable(self):
+        self.omdb.retries = 0
+        self.omdb.adapter.responses.append((200, requests.Timeout()))
+        req = APIRequestFactory().post(self.url, {'Title': self.title})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 503
+        assert not models.Movie.objects.filter(Title=self.title).exists()
+
     # Test get request
     def test_MovieList_get(self):
         req = APIRequestFactory().get(self.url)
@@ -121,6 +220,454 @@ class TestMoviesList(APITestCase):
         assert resp.status_code == 200
 
 
+class TestMovieQueries(APITestCase):
+
+    def setUp(self):
+        self.movies = mixer.cycle(5).blend('movies.Movie')
+        for movie in self.movies:
+            mixer.cycle(2).blend('movies.Rating', Movie=movie)
+            mixer.cycle(3).blend('movies.Comment', movie=movie)
+        self.url = reverse('movies:movies-list')
+
+    # Validator (last change and count of movies and comments), movies with
+    # number of comments, ratings
+    def test_MovieList_get_queries(self):
+        req = APIRequestFactory().get(self.url)
+        with self.assertNumQueries(6):
+            resp = views.MoviesList.as_view()(req)
+            resp.render()
+        movie = resp.data['results'][0]
+        assert movie['comment_count'] == 3
+        assert len(movie['Ratings']) == 2
+        assert movie['comments_url'].endswith(
+            '/comments/?movie={}'.format(movie['id']))
+        assert 'comments' not in movie
+
+    def test_MovieList_get_expand_comments(self):
+        req = APIRequestFactory().get(self.url, {'expand': 'comments'})
+        with self.assertNumQueries(7):
+            resp = views.MoviesList.as_view()(req)
+            resp.render()
+        movie = models.Movie.objects.get(pk=resp.data['results'][0]['id'])
+        assert resp.data['results'][0]['comments'] == list(
+            movie.comments.order_by('pk').values_list('pk', flat=True))
+
+    def test_MovieDetail_get_queries(self):
+        movie = self.movies[0]
+        req = APIRequestFactory().get(movie.get_absolute_url())
+        with self.assertNumQueries(3):
+            resp = views.MovieDetail.as_view()(req, pk=movie.pk)
+            resp.render()
+        assert resp.data['comment_count'] == 3
+
+    # Validator, movies with selected columns only
+    def test_MovieList_get_sparse_fields(self):
+        req = APIRequestFactory().get(self.url, {'fields': 'Title,Year,url'})
+        with CaptureQueriesContext(connection) as queries:
+            resp = views.MoviesList.as_view()(req)
+            resp.render()
+        assert len(queries) == 5
+        assert '"Plot"' not in queries[-1]['sql']
+        assert set(resp.data['results'][0]) == {'Title', 'Year', 'url'}
+
+    def test_MovieList_get_omit_fields(self):
+        req = APIRequestFactory().get(
+            self.url, {'omit': 'Ratings,comment_count,Plot'})
+        with self.assertNumQueries(5):
+            resp = views.MoviesList.as_view()(req)
+            resp.render()
+        movie = resp.data['results'][0]
+        assert 'Ratings' not in movie and 'Plot' not in movie
+        assert 'comments_url' in movie
+
+    def test_MovieList_get_unknown_field(self):
+        req = APIRequestFactory().get(self.url, {'fields': 'Title,Budget'})
+        resp = views.MoviesList.as_view()(req)
+        assert resp.status_code == 400
+
+    def test_MovieDetail_get_sparse_fields(self):
+        movie = self.movies[0]
+        req = APIRequestFactory().get(
+            movie.get_absolute_url(), {'fields': 'Title,comment_count'})
+        with self.assertNumQueries(2):
+            resp = views.MovieDetail.as_view()(req, pk=movie.pk)
+            resp.render()
+        assert resp.data == {'Title': movie.Title, 'comment_count': 3}
+
+
+class TestKeysetPagination(APITestCase):
+
+    def setUp(self):
+        # Movies with repeated years, so primary key has to break ties
+        self.movies = [
+            mixer.blend('movies.Movie', Year=2000 + index % 3)
+            for index in range(7)
+        ]
+        self.url = reverse('movies:movies-list')
+
+    def get(self, url, params=None):
+        req = APIRequestFactory().get(url, params)
+        resp = views.MoviesList.as_view()(req)
+        resp.render()
+        return resp
+
+    def test_walk_pages_forward_and_back(self):
+        expected = list(models.Movie.objects.order_by(
+            '-Year', 'pk').values_list('pk', flat=True))
+        resp = self.get(self.url, {
+            'pagination': 'cursor', 'ordering': '-Year', 'page_size': 3,
+            'fields': 'id'})
+        assert 'count' not in resp.data
+        assert resp.data['previous'] is None
+        pages = [resp.data]
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']).data)
+        ids = [row['id'] for page in pages for row in page['results']]
+        assert ids == expected
+        assert len(pages) == 3
+
+        previous = self.get(pages[-1]['previous']).data
+        assert previous['results'] == pages[1]['results']
+        assert previous['next'] and previous['previous']
+
+    def test_deep_page_without_count_and_offset(self):
+        resp = self.get(self.url, {'pagination': 'cursor', 'page_size': 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.get(resp.data['next'])
+        sqls = [query['sql'] for query in queries]
+        assert not any('COUNT(*)' in sql and 'movies_comment' not in sql
+                       for sql in sqls)
+        assert not any('OFFSET' in sql for sql in sqls)
+
+    def test_invalid_cursor(self):
+        resp = self.get(self.url, {'cursor': 'invalid'})
+        assert resp.status_code == 404
+
+    def test_cursor_from_different_ordering(self):
+        resp = self.get(self.url, {'pagination': 'cursor', 'page_size': 2})
+        resp = self.get(resp.data['next'] + '&ordering=Title')
+        assert resp.status_code == 404
+
+    def test_comments_cursor(self):
+        comments = mixer.cycle(5).blend(
+            'movies.Comment', movie=self.movies[0])
+        req = APIRequestFactory().get(
+            reverse('movies:comments-list'),
+            {'pagination': 'cursor', 'page_size': 3, 'ordering': 'user'})
+        first = views.CommentsList.as_view()(req).data
+        req = APIRequestFactory().get(first['next'])
+        second = views.CommentsList.as_view()(req).data
+        users = [row['user'] for row in first['results'] + second['results']]
+        assert users == sorted(comment.user for comment in comments)
+        assert second['next'] is None
+
+
+class TestTypedFieldsFilters(APITestCase):
+
+    def setUp(self):
+        self.movies = [
+            mixer.blend('movies.Movie', imdbRating=rating, imdbVotes=votes)
+            for rating, votes in (('8.2', '48,218'), ('N/A', 'N/A'),
+                                  ('7.9', '1,200,000'), ('8.5', '950'))
+        ]
+        self.url = reverse('movies:movies-list')
+
+    def get_ids(self, params):
+        req = APIRequestFactory().get(self.url, {'fields': 'id', **params})
+        resp = views.MoviesList.as_view()(req)
+        return [movie['id'] for movie in resp.data['results']]
+
+    def test_filter_and_order(self):
+        first, missing, popular, rare = self.movies
+        assert self.get_ids({'imdbRating__gte': 8, 'ordering': '-imdbVotes'}
+                            ) == [first.pk, rare.pk]
+        # Movies without value are placed at the end in both directions
+        assert self.get_ids({'ordering': 'imdbRating'}) == [
+            popular.pk, first.pk, rare.pk, missing.pk]
+        assert self.get_ids({'ordering': '-imdbVotes'}) == [
+            popular.pk, first.pk, rare.pk, missing.pk]
+
+    def test_cursor_pagination_with_null_values(self):
+        expected = self.get_ids({'ordering': '-imdbRating'})
+        params = {'fields': 'id', 'ordering': '-imdbRating',
+                  'pagination': 'cursor', 'page_size': 1}
+        pages = [views.MoviesList.as_view()(
+            APIRequestFactory().get(self.url, params)).data]
+        while pages[-1]['next']:
+            req = APIRequestFactory().get(pages[-1]['next'])
+            pages.append(views.MoviesList.as_view()(req).data)
+        assert [page['results'][0]['id'] for page in pages] == expected
+        # Walk back from the movie without rating
+        req = APIRequestFactory().get(pages[-1]['previous'])
+        assert views.MoviesList.as_view()(req).data['results'] == pages[-2][
+            'results']
+
+
+class TestGenreFilter(APITestCase):
+
+    def setUp(self):
+        self.drama = mixer.blend('movies.Movie', Genre='Drama')
+        self.action = mixer.blend('movies.Movie', Genre='Action, Drama')
+        self.other = mixer.blend('movies.Movie', Genre='Melodrama, Action')
+        self.url = reverse('movies:movies-list')
+
+    def get_ids(self, query):
+        req = APIRequestFactory().get(self.url + query)
+        resp = views.MoviesList.as_view()(req)
+        return sorted(movie['id'] for movie in resp.data['results'])
+
+    def test_exact_genre(self):
+        assert self.get_ids('?genre=Drama') == [
+            self.drama.pk, self.action.pk]
+        assert self.get_ids('?genre=Western') == []
+
+    def test_all_or_any_genres(self):
+        assert self.get_ids('?genre=Drama&genre=Action') == [self.action.pk]
+        assert self.get_ids('?genre=Drama&genre=Action&genre_match=any') == [
+            self.drama.pk, self.action.pk, self.other.pk]
+
+    def test_genres_updated_on_save(self):
+        self.other.Genre = 'Drama'
+        self.other.save()
+        assert self.get_ids('?genre=Drama') == [
+            self.drama.pk, self.action.pk, self.other.pk]
+        assert list(self.other.genres.values_list('name', flat=True)) == [
+            'Drama']
+
+
+@mock.patch.object(views.ResponseCacheMixin, 'response_cache_timeout', 60)
+class TestResponseCache(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie', Year='1999')
+        mixer.blend('movies.Rating', Movie=self.movie)
+        self.url = reverse('movies:movies-list')
+
+    def get(self, params=None, view=views.MoviesList, url=None, **kwargs):
+        req = APIRequestFactory().get(url or self.url, params)
+        resp = view.as_view()(req, **kwargs)
+        resp.render()
+        return resp
+
+    def test_MoviesList_cached(self):
+        data = self.get({'Year': '1999', 'ordering': 'Title'}).data
+        # Only the validator of conditional request is computed
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.get({'ordering': 'Title', 'Year': '1999', 'q': ''})
+        assert resp.data == data
+        assert len(queries) == 3
+        assert len(self.get({'Year': '2000'}).data['results']) == 0
+
+    def test_invalidated_by_changes(self):
+        detail = self.movie.get_absolute_url()
+        self.get()
+        self.get(view=views.MovieDetail, url=detail, pk=self.movie.pk)
+        mixer.blend('movies.Comment', movie=self.movie)
+        assert self.get().data['results'][0]['comment_count'] == 1
+        mixer.blend('movies.Rating', Movie=self.movie)
+        resp = self.get(view=views.MovieDetail, url=detail, pk=self.movie.pk)
+        assert len(resp.data['Ratings']) == 2
+        self.movie.delete()
+        assert self.get().data['results'] == []
+
+    # Responses are cached for state of their validator, so changes made by
+    # other processes (which don't invalidate cache of this one) are served
+    def test_changed_by_other_process(self):
+        self.get()
+        models.Movie.objects.filter(pk=self.movie.pk).update(
+            Title='Changed', updated=timezone.now())
+        assert self.get().data['results'][0]['Title'] == 'Changed'
+
+    # Generation evicted by cache backend doesn't start again from a value
+    # used before, so responses cached under it aren't served
+    def test_evicted_generation(self):
+        self.get()
+        generation = cache.get_generation('responses')
+        django_cache.delete('generation:responses')
+        assert cache.get_generation('responses') > generation
+        generation = cache.bump_generation('responses')
+        django_cache.delete('generation:responses')
+        assert cache.bump_generation('responses') > generation
+
+    def test_errors_not_cached(self):
+        resp = self.get({'fields': 'Budget'})
+        assert resp.status_code == 400
+        self.get({'fields': 'Budget'})
+
+        admin = mixer.blend('auth.User', is_staff=True)
+        req = APIRequestFactory().get(reverse('movies:stats'))
+        force_authenticate(req, user=admin)
+        resp = views.StatsView.as_view()(req)
+        assert resp.data['responses'] == {'hits': 0, 'misses': 2}
+
+    def test_disabled(self):
+        with mock.patch.object(views.MoviesList, 'response_cache_timeout', 0):
+            self.get()
+            with CaptureQueriesContext(connection) as queries:
+                self.get()
+        # Validator, movies and ratings (counts are cached)
+        assert len(queries) == 5
+
+
+class TestOMDbPurge(APITestCase):
+
+    def post(self, data, user):
+        req = APIRequestFactory().post(
+            reverse('movies:omdb-purge'), data, format='json')
+        force_authenticate(req, user=user)
+        return views.OMDbPurgeView.as_view()(req)
+
+    def test_purge(self):
+        client = stub_client(omdb_payload('Free Solo'))
+        client.get_movie('Unknown')
+        client.get_movie('Free Solo')
+        admin = mixer.blend('auth.User', is_staff=True)
+        with mock.patch('movies.omdb.get_client', return_value=client):
+            assert self.post({}, admin).status_code == 200
+            client.get_movie('Unknown')
+            client.get_movie('Free Solo')
+            assert len(client.adapter.requests) == 3
+            assert self.post({'all': True}, admin).status_code == 200
+            client.get_movie('Free Solo')
+            assert len(client.adapter.requests) == 4
+
+    def test_purge_staff_only(self):
+        user = mixer.blend('auth.User', is_staff=False)
+        assert self.post({}, user).status_code == 403
+
+
+class TestMovieFacets(APITestCase):
+
+    def setUp(self):
+        self.movies = [
+            mixer.blend('movies.Movie', Genre=genre, Year=year,
+                        imdbRating=rating)
+            for genre, year, rating in (
+                ('Drama', 1994, '9.3'), ('Action, Drama', 2008, '9.0'),
+                ('Action', 2010, '8.8'), ('Comedy', 2010, 'N/A'))
+        ]
+        self.url = reverse('movies:movie-facets')
+
+    def get(self, params=None):
+        req = APIRequestFactory().get(self.url, params)
+        resp = views.MovieFacets.as_view()(req)
+        resp.render()
+        return resp.data
+
+    def test_all_movies_from_precomputed_counts(self):
+        with self.assertNumQueries(1):
+            data = self.get()
+        assert data == {
+            'genre': [{'value': 'Action', 'count': 2},
+                      {'value': 'Drama', 'count': 2},
+                      {'value': 'Comedy', 'count': 1}],
+            'year': [{'value': 1994, 'count': 1},
+                     {'value': 2008, 'count': 1},
+                     {'value': 2010, 'count': 2}],
+            'decade': [{'value': 1990, 'count': 1},
+                       {'value': 2000, 'count': 1},
+                       {'value': 2010, 'count': 2}],
+            'rating': [{'value': 8, 'count': 1},
+                       {'value': 9, 'count': 2},
+                       {'value': None, 'count': 1}],
+        }
+        # Precomputed counts match counts computed from movies
+        counts = facets.count(models.Movie.objects.all(),
+                              models.Movie.genres.through.objects.all())
+        assert facets.serialize(counts) == data
+
+    def test_precomputed_counts_updated_on_write(self):
+        movie = self.movies[0]
+        movie.Genre = 'Comedy'
+        movie.Year = 2011
+        movie.save()
+        self.movies[3].delete()
+        data = self.get()
+        assert data['genre'] == [{'value': 'Action', 'count': 2},
+                                 {'value': 'Comedy', 'count': 1},
+                                 {'value': 'Drama', 'count': 1}]
+        assert data['decade'] == [{'value': 2000, 'count': 1},
+                                  {'value': 2010, 'count': 2}]
+        assert data['rating'] == [{'value': 8, 'count': 1},
+                                  {'value': 9, 'count': 2}]
+
+    def test_filtered_movies(self):
+        params = {'genre': 'Action', 'Year__gt': 2000}
+        # One grouped query per facet
+        with self.assertNumQueries(4):
+            data = self.get(params)
+        assert data['genre'] == [{'value': 'Action', 'count': 2},
+                                 {'value': 'Drama', 'count': 1}]
+        assert data['year'] == [{'value': 2008, 'count': 1},
+                                {'value': 2010, 'count': 1}]
+        with self.assertNumQueries(0):
+            assert self.get(params) == data
+        mixer.blend('movies.Movie', Genre='Action', Year=2019)
+        assert self.get(params)['decade'] == [
+            {'value': 2000, 'count': 1}, {'value': 2010, 'count': 2}]
+
+    def test_searched_movies(self):
+        models.Movie.objects.filter(pk=self.movies[1].pk).update(
+            Title='The Dark Knight')
+        data = self.get({'search': 'knight'})
+        assert data['genre'] == [{'value': 'Action', 'count': 1},
+                                 {'value': 'Drama', 'count': 1}]
+        assert data['year'] == [{'value': 2008, 'count': 1}]
+        data = self.get({'search': 'knight', 'genre': 'Comedy'})
+        assert data['genre'] == []
+
+
+class TestMoviesBulkImport(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie', Title='The Dawn Wall')
+        self.omdb = stub_client(
+            omdb_payload('Free Solo'),
+            omdb_payload('Meru', imdbID='tt2545428'),
+        )
+        patcher = mock.patch('movies.omdb.get_client', return_value=self.omdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = mixer.blend('auth.User', is_staff=True)
+        self.url = reverse('movies:movies-bulk')
+
+    def post(self, data, user=None):
+        req = APIRequestFactory().post(self.url, data, format='json')
+        force_authenticate(req, user=user or self.admin)
+        return views.MoviesBulkImport.as_view()(req)
+
+    def test_MoviesBulkImport_post(self):
+        resp = self.post({
+            'titles': ['Free Solo', 'the dawn wall', 'Unknown', 'free solo'],
+            'imdbIDs': ['tt2545428'],
+        })
+        assert resp.status_code == 200
+        assert [item['status'] for item in resp.data] == [
+            201, 204, 204, 204, 201
+        ]
+        assert resp.data[0]['data']['Title'] == 'Free Solo'
+        assert resp.data[4]['imdbID'] == 'tt2545428'
+        assert models.Movie.objects.filter(
+            Title__in=['Free Solo', 'Meru']).count() == 2
+        # Saved movie isn't requested from OMDb
+        assert len(self.omdb.adapter.requests) == 3
+
+    def test_MoviesBulkImport_post_invalid_request(self):
+        resp = self.post({'titles': []})
+        assert resp.status_code == 400
+
+    def test_MoviesBulkImport_post_too_many(self):
+        with mock.patch('movies.views.OMDb_BULK_MAX_ITEMS', 1):
+            resp = self.post({'titles': ['Free Solo', 'Meru']})
+        assert resp.status_code == 400
+        assert self.omdb.adapter.requests == []
+
+    def test_MoviesBulkImport_post_not_admin(self):
+        user = mixer.blend('auth.User', is_staff=False)
+        resp = self.post({'titles': ['Free Solo']}, user=user)
+        assert resp.status_code == 403
+
+
 class TestCommentsList(APITestCase):
 
     def setUp(self):
@@ -152,6 +699,15 @@ class TestCommentsList(APITestCase):
         assert resp.status_code == 201
         assert check_comment_in_db is True
 
+    def test_CommentList_get_sparse_fields(self):
+        comment = mixer.blend('movies.Comment', movie=self.movie)
+        req = APIRequestFactory().get(self.url, {'fields': 'user,movie_url'})
+        resp = views.CommentsList.as_view()(req)
+        assert resp.data['results'] == [{
+            'user': comment.user,
+            'movie_url': 'http://testserver' + self.movie.get_absolute_url(),
+        }]
+
     def test_CommentList_post_invalid_data(self):
         invalid_data = {**self.comment_data,
                         'comment': '',
@@ -185,6 +741,314 @@ class TestCommentsList(APITestCase):
             'Should return 5 - 5 objects have been created (mixer.cycle(5)).'
         )
 
+    def test_CommentList_post_many(self):
+        other = mixer.blend('movies.Movie', Title='Free Solo')
+        items = [
+            self.comment_data,
+            {**self.comment_data, 'movie': 999999},
+            {**self.comment_data, 'movie': other.pk, 'user': 'Other User'},
+            {**self.comment_data, 'comment': ''},
+            'not a comment',
+        ]
+        req = APIRequestFactory().post(self.url, items, format='json')
+        with CaptureQueriesContext(connection) as queries:
+            resp = views.CommentsList.as_view()(req)
+        assert resp.status_code == 200
+        assert [item['status'] for item in resp.data] == [201, 400, 201, 400,
+                                                          400]
+        assert resp.data[1]['data'] == {
+            'movie': ['Invalid pk "999999" - object does not exist.']}
+        assert 'comment' in resp.data[3]['data']
+
+        # Existence of movies is checked with one query, all comments are
+        # inserted with one query
+        movie_queries = [query['sql'] for query in queries
+                         if 'FROM "movies_movie"' in query['sql']]
+        assert len(movie_queries) == 1
+        inserts = [query['sql'] for query in queries
+                   if query['sql'].startswith('INSERT INTO "movies_comment"')]
+        assert len(inserts) == 1
+
+        # Created comments are returned the same as by CommentDetail
+        for item in (resp.data[0], resp.data[2]):
+            comment = models.Comment.objects.get(pk=item['data']['url'].split(
+                '/')[-2])
+            detail = views.CommentDetail.as_view()(
+                APIRequestFactory().get('/'), pk=comment.pk)
+            assert item['data'] == detail.data
+        assert models.Comment.objects.count() == 2
+
+    # Backends other than SQLite which don't return primary keys from bulk
+    # insert reload rows matched by their values
+    @mock.patch('movies.views.connection', mock.Mock(vendor='mysql'))
+    def test_CommentList_post_many_reloads_pks(self):
+        mixer.cycle(2).blend('movies.Comment', movie=self.movie,
+                             user=self.comment_data['user'],
+                             comment=self.comment_data['comment'])
+        items = [self.comment_data, self.comment_data,
+                 {**self.comment_data, 'user': 'Other User'}]
+        req = APIRequestFactory().post(self.url, items, format='json')
+        resp = views.CommentsList.as_view()(req)
+        pks = [int(item['data']['url'].split('/')[-2]) for item in resp.data]
+        assert len(set(pks)) == 3
+        assert [models.Comment.objects.get(pk=pk).user for pk in pks] == [
+            'Test User', 'Test User', 'Other User']
+        assert min(pks) > max(models.Comment.objects.exclude(
+            pk__in=pks).values_list('pk', flat=True))
+
+    def test_CommentList_post_many_updates_counts(self):
+        mixer.blend('movies.Movie', Title='Free Solo')
+        # Cached ranking is invalidated by created comments
+        views.TopList.as_view()(APIRequestFactory().get('/top/'))
+        items = [self.comment_data] * 3
+        req = APIRequestFactory().post(self.url, items, format='json')
+        views.CommentsList.as_view()(req)
+        assert models.CommentDailyCount.objects.get(
+            movie=self.movie).count == 3
+
+        resp = views.TopList.as_view()(APIRequestFactory().get('/top/'))
+        data = json.loads(b''.join(resp.streaming_content))
+        assert data[0]['id'] == self.movie.pk
+        assert data[0]['total_comments'] == 3
+
+    def test_CommentList_post_many_limit(self):
+        with mock.patch.object(views, 'COMMENTS_BULK_MAX_ITEMS', 2):
+            for items in ([], [self.comment_data] * 3):
+                req = APIRequestFactory().post(self.url, items, format='json')
+                resp = views.CommentsList.as_view()(req)
+                assert resp.status_code == 400
+                assert resp.data == {
+                    'Error': 'Please provide from 1 to 2 comments.'}
+        assert not models.Comment.objects.exists()
+
+
+class TestEstimatedCount(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie')
+        mixer.cycle(5).blend('movies.Comment', movie=self.movie)
+        self.url = reverse('movies:comments-list')
+
+    def get(self, params=None):
+        req = APIRequestFactory().get(self.url, params)
+        return views.CommentsList.as_view()(req)
+
+    def test_total_count_cached_until_rows_change(self):
+        assert self.get().data['count'] == 5
+        # Only the last change and comments are fetched, count is taken
+        # from cache
+        with self.assertNumQueries(2):
+            assert self.get({'fields': 'user'}).data['count'] == 5
+        mixer.blend('movies.Comment', movie=self.movie)
+        assert self.get().data['count'] == 6
+        models.Comment.objects.first().delete()
+        assert self.get().data['count'] == 5
+
+    @mock.patch(
+        'movies.pagination.CommentsLimitPagination.count_cap', 3)
+    def test_filtered_count_capped(self):
+        resp = self.get({'movie': self.movie.pk, 'page_size': 2})
+        assert resp.data['count'] == '3+'
+        assert resp.data['next'] is not None
+        resp = self.get({'movie': self.movie.pk, 'count': 'exact'})
+        assert resp.data['count'] == 5
+        resp = self.get({'user': 'nobody'})
+        assert resp.data['count'] == 0
+
+    # Pages after the capped count are available
+    @mock.patch(
+        'movies.pagination.CommentsLimitPagination.count_cap', 3)
+    def test_pages_after_capped_count(self):
+        mixer.cycle(2).blend('movies.Comment', movie=self.movie)
+        params = {'movie': self.movie.pk, 'page_size': 2}
+        resp = self.get({**params, 'page': 3})
+        assert resp.status_code == 200
+        assert len(resp.data['results']) == 2
+        assert resp.data['next'].endswith('page=4&page_size=2')
+        resp = self.get({**params, 'page': 4})
+        assert len(resp.data['results']) == 1
+        assert resp.data['next'] is None
+        assert resp.data['previous'] is not None
+        assert self.get({**params, 'page': 5}).status_code == 404
+        assert self.get({'user': 'nobody', 'page': 1}).status_code == 200
+
+
+class TestConditionalGet(APITestCase):
+
+    def setUp(self):
+        self.movie = mixer.blend('movies.Movie')
+        self.comment = mixer.blend('movies.Comment', movie=self.movie)
+
+    def get(self, view, url, headers=None, **kwargs):
+        req = APIRequestFactory().get(url, **(headers or {}))
+        resp = view.as_view()(req, **kwargs)
+        if resp.status_code != 304 and not resp.streaming:
+            resp.render()
+        return resp
+
+    def test_MoviesList_not_modified(self):
+        url = reverse('movies:movies-list')
+        resp = self.get(views.MoviesList, url)
+        etag = resp['ETag']
+        assert etag.startswith('"') and 'Last-Modified' in resp
+        # Only the validator is computed, movies aren't fetched
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.get(views.MoviesList, url,
+                            {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 304
+        assert resp['ETag'] == etag and not resp.content
+        assert len(queries) == 3
+
+        assert self.get(views.MoviesList, url + '?Year=1999')['ETag'] != etag
+        mixer.blend('movies.Comment', movie=self.movie)
+        resp = self.get(views.MoviesList, url, {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 200
+        assert resp['ETag'] != etag
+
+    # Validators are read from the database, so changes made by other
+    # processes (which don't invalidate cache of this one) change them
+    def test_validated_without_cache(self):
+        url = reverse('movies:movies-list')
+        etag = self.get(views.MoviesList, url)['ETag']
+        django_cache.clear()
+        resp = self.get(views.MoviesList, url, {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 304
+        # Update without signals, as if made by other process
+        models.Comment.objects.filter(pk=self.comment.pk).update(
+            comment='Changed', updated=timezone.now())
+        resp = self.get(views.MoviesList, url, {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 200
+
+    # Ranking is validated by state of movies, comments and daily counts and
+    # by date range, the ranking isn't computed for 304
+    def test_TopList_not_modified(self):
+        url = reverse('movies:top')
+        resp = self.get(views.TopList, url + '?since=2019-01-01')
+        etag = resp['ETag']
+        assert resp.streaming
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.get(views.TopList, url + '?since=2019-01-01',
+                            {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 304
+        assert len(queries) == 3
+        assert self.get(views.TopList, url + '?since=2019-01-02')[
+            'ETag'] != etag
+
+        mixer.blend('movies.Comment', movie=self.movie)
+        resp = self.get(views.TopList, url + '?since=2019-01-01',
+                        {'HTTP_IF_NONE_MATCH': etag})
+        assert resp.status_code == 200
+        resp = self.get(views.TopList, url + '?since=2019-1-1&limit=5')
+        assert resp['ETag'] != etag
+
+        resp = self.get(views.TopList, url + '?since=2019/01/01')
+        assert resp.status_code == 400
+        assert 'ETag' not in resp
+
+    def test_MovieDetail_changed_by_comments(self):
+        url = self.movie.get_absolute_url()
+        etag = self.get(views.MovieDetail, url, pk=self.movie.pk)['ETag']
+        resp = self.get(views.MovieDetail, url, {'HTTP_IF_NONE_MATCH': etag},
+                        pk=self.movie.pk)
+        assert resp.status_code == 304
+        self.comment.delete()
+        resp = self.get(views.MovieDetail, url, {'HTTP_IF_NONE_MATCH': etag},
+                        pk=self.movie.pk)
+        assert resp.status_code == 200
+        assert resp.data['comment_count'] == 0
+
+    def test_MovieDetail_changed_by_ratings(self):
+        url = self.movie.get_absolute_url()
+        rating = mixer.blend('movies.Rating', Movie=self.movie)
+        etag = self.get(views.MovieDetail, url, pk=self.movie.pk)['ETag']
+        rating.Value = '10/10'
+        rating.save()
+        resp = self.get(views.MovieDetail, url, {'HTTP_IF_NONE_MATCH': etag},
+                        pk=self.movie.pk)
+        assert resp.status_code == 200
+        assert resp.data['Ratings'][0]['Value'] == '10/10'
+
+    def test_MovieDetail_not_found(self):
+        resp = self.get(views.MovieDetail, '/movies/0/', pk=0)
+        assert resp.status_code == 404
+        assert 'ETag' not in resp
+
+    def test_CommentDetail_if_modified_since(self):
+        url = reverse('movies:comment-detail', args=[self.comment.pk])
+        resp = self.get(views.CommentDetail, url, pk=self.comment.pk)
+        last_modified = resp['Last-Modified']
+        resp = self.get(views.CommentDetail, url,
+                        {'HTTP_IF_MODIFIED_SINCE': last_modified},
+                        pk=self.comment.pk)
+        assert resp.status_code == 304
+        self.comment.comment = 'Changed'
+        self.comment.save()
+        resp = self.get(views.CommentDetail, url,
+                        {'HTTP_IF_NONE_MATCH': resp['ETag']},
+                        pk=self.comment.pk)
+        assert resp.status_code == 200
+        assert resp.data['comment'] == 'Changed'
+
+
+# Output of fast serialization is the same as of serializers and JSONRenderer
+class TestFastSerialization(APITestCase):
+
+    def setUp(self):
+        titles = ['Amélie "Le fabuleux"', 'Line\u2028separator',
+                  'Tab\tand\x01', 'Plain', 'Żółw']
+        for year, title in enumerate(titles, 1990):
+            movie = mixer.blend('movies.Movie', Title=title, Year=str(year),
+                                imdbRating=str(year % 10))
+            mixer.cycle(2).blend('movies.Rating', Movie=movie)
+            mixer.cycle(year % 3).blend('movies.Comment', movie=movie)
+
+    def render(self, view, url, params=None, fast=True):
+        renderers = (FastJSONRenderer, ) if fast else (JSONRenderer, )
+        with mock.patch.object(view, 'fast_serialization', fast), \
+                mock.patch.object(view, 'renderer_classes', renderers):
+            resp = view.as_view()(APIRequestFactory().get(url, params))
+            if resp.streaming:
+                return b''.join(resp.streaming_content)
+            return resp.render().content
+
+    def assert_same(self, view, url, params=None):
+        content = self.render(view, url, params)
+        assert content == self.render(view, url, params, fast=False)
+        return json.loads(content.decode('utf-8'))
+
+    def test_MoviesList(self):
+        url = reverse('movies:movies-list')
+        for params in (None, {'expand': 'comments'}, {'omit': 'Ratings'},
+                       {'fields': 'Title,url,comments_url'},
+                       {'ordering': '-imdbRating', 'page': 2},
+                       {'search': 'plain'}, {'genre': 'none'}):
+            self.assert_same(views.MoviesList, url, params)
+
+    def test_MoviesList_cursor(self):
+        url = reverse('movies:movies-list')
+        params = {'pagination': 'cursor', 'ordering': '-Year', 'page_size': 2}
+        data = self.assert_same(views.MoviesList, url, params)
+        assert len(data['results']) == 2
+        data = self.assert_same(views.MoviesList, data['next'])
+        assert [movie['Year'] for movie in data['results']] == [1992, 1991]
+
+    def test_CommentsList(self):
+        url = reverse('movies:comments-list')
+        for params in (None, {'fields': 'movie_url,created'},
+                       {'ordering': '-movie', 'pagination': 'cursor'}):
+            self.assert_same(views.CommentsList, url, params)
+
+    def test_TopList(self):
+        url = reverse('movies:top')
+        assert len(self.assert_same(views.TopList, url)) == 5
+        data = self.assert_same(views.TopList, url, {'limit': 2})
+        self.assert_same(views.TopList, data['next'])
+
+
+# Queries computing the ranking, without queries of its validator
+def ranking_queries(queries):
+    return [query for query in queries if 'RANK()' in query['sql']]
+
 
 class TestTopList(APITestCase):
 
@@ -209,12 +1073,17 @@ class TestTopList(APITestCase):
 
         self.url = reverse('movies:top')
 
+    # Whole ranking is returned as streamed response
+    @staticmethod
+    def streamed_data(resp):
+        return json.loads(b''.join(resp.streaming_content).decode('utf-8'))
+
     # Test functionality without passing parameters 'since', 'to'
     def test_TopList_default_date(self):
         req = APIRequestFactory().get(self.url)
         resp = views.TopList.as_view()(req)
-        # data - list of OrdereDict - total_comments ordered descending
-        data = resp.data
+        # data - list of dicts - total_comments ordered descending
+        data = self.streamed_data(resp)
 
         rank_position_1 = (
             data[0]['id'], data[0]['rank'], data[0]['total_comments']
@@ -264,8 +1133,8 @@ class TestTopList(APITestCase):
         req = APIRequestFactory().get(self.url, {'since': '2005-05-01',
                                                  'to': '2016-05-02'})
         resp = views.TopList.as_view()(req)
-        # data - list of OrdereDict - total_comments ordered descending
-        data = resp.data
+        # data - list of dicts - total_comments ordered descending
+        data = self.streamed_data(resp)
         expected_id = (
             self.movie_1.id, self.movie_2.id, self.movie_3.id,
             self.movie_4.id, self.movie_5.id, self.movie_6.id,
@@ -284,7 +1153,7 @@ class TestTopList(APITestCase):
         to = '2005-05-01'
         req = APIRequestFactory().get(self.url, {'to': to})
         resp = views.TopList.as_view()(req)
-        assert len(resp.data) == 6, (
+        assert len(self.streamed_data(resp)) == 6, (
             'Should return 6 objects, because 6 movies already exists in DB.'
         )
         assert resp.status_code == 200
@@ -294,11 +1163,92 @@ class TestTopList(APITestCase):
         since = '2012-08-11'
         req = APIRequestFactory().get(self.url, {'since': since})
         resp = views.TopList.as_view()(req)
-        assert len(resp.data) == 6, (
+        assert len(self.streamed_data(resp)) == 6, (
             'Should return 6 objects, because 6 movies already exists in DB.'
         )
         assert resp.status_code == 200
 
+    # Ranking is computed in one query regardless of the number of movies
+    def test_TopList_query_count_constant(self):
+        req = APIRequestFactory().get(self.url)
+        with CaptureQueriesContext(connection) as before:
+            self.streamed_data(views.TopList.as_view()(req))
+
+        movies = mixer.cycle(10).blend('movies.Movie')
+        for movie in movies:
+            mixer.cycle(2).blend('movies.Comment', movie=movie)
+        req = APIRequestFactory().get(self.url)
+        with CaptureQueriesContext(connection) as after:
+            data = self.streamed_data(views.TopList.as_view()(req))
+
+        assert len(data) == 16
+        assert len(ranking_queries(before)) == 1, (
+            'Ranking should be computed in a single query.'
+        )
+        assert len(before) == len(after)
+
+    # Test ranking split into pages - ranks are the same as in whole ranking
+    def test_TopList_paginated(self):
+        req = APIRequestFactory().get(self.url, {'limit': 2})
+        resp = views.TopList.as_view()(req)
+        assert resp.status_code == 200
+        assert resp.data['previous'] is None
+        assert [i['rank'] for i in resp.data['results']] == [1, 2]
+
+        req = APIRequestFactory().get(resp.data['next'])
+        resp = views.TopList.as_view()(req)
+        assert [i['rank'] for i in resp.data['results']] == [2, 4]
+        assert resp.data['previous'] is not None
+
+        req = APIRequestFactory().get(resp.data['next'])
+        resp = views.TopList.as_view()(req)
+        assert [i['rank'] for i in resp.data['results']] == [4, 6]
+        assert resp.data['next'] is None
+
+    # Ranking is served from cache until comments change
+    def test_TopList_cached(self):
+        req = APIRequestFactory().get(self.url, {'since': '2012-08-11'})
+        data = self.streamed_data(views.TopList.as_view()(req))
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.streamed_data(views.TopList.as_view()(req))
+        assert cached == data
+        assert ranking_queries(queries) == []
+
+        mixer.blend('movies.Comment', movie=self.movie_6)
+        data = self.streamed_data(views.TopList.as_view()(req))
+        assert data[5]['total_comments'] == 1
+
+        admin = mixer.blend('auth.User', is_staff=True)
+        req = APIRequestFactory().get(reverse('movies:stats'))
+        force_authenticate(req, user=admin)
+        resp = views.StatsView.as_view()(req)
+        assert resp.data['top'] == {'hits': 1, 'misses': 2}
+
+    # Ranking is cached in chunks, rows after the first missing chunk are
+    # fetched with one query
+    @mock.patch('movies.cache.CachedRows.chunk_size', 4)
+    def test_TopList_cached_chunks(self):
+        req = APIRequestFactory().get(self.url)
+        data = self.streamed_data(views.TopList.as_view()(req))
+        assert len(data) == 6
+        key = 'top:{}:2000-01-01:{:%Y-%m-%d}'.format(
+            cache.get_generation('top'), datetime.date.today())
+        assert len(django_cache.get(key + ':0:4')) == 4
+        assert len(django_cache.get(key + ':4:8')) == 2
+
+        django_cache.delete(key + ':4:8')
+        with CaptureQueriesContext(connection) as queries:
+            assert self.streamed_data(views.TopList.as_view()(req)) == data
+        queries = ranking_queries(queries)
+        assert len(queries) == 1
+        assert 'OFFSET 4' in queries[0]['sql']
+        assert len(django_cache.get(key + ':4:8')) == 2
+
+    def test_TopList_invalid_cursor(self):
+        req = APIRequestFactory().get(self.url, {'cursor': 'invalid'})
+        resp = views.TopList.as_view()(req)
+        assert resp.status_code == 404
+
     # Date in incorrect format
     def test_TopList_inccorect_date_format_since(self):
         # Incorrect since date format
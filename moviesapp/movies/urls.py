@@ -1,16 +1,28 @@
 from django.conf.urls import url
 
 from movies.views import (
-    CommentDetail, CommentsList, MovieDetail, MoviesList, TopList
+    CommentDetail,
+    CommentsList,
+    MovieDetail,
+    MovieFacets,
+    MoviesBulkImport,
+    MoviesList,
+    OMDbPurgeView,
+    StatsView,
+    TopList,
 )
 
 app_name = 'movies'
 
 urlpatterns = [
     url(r'^movies/$', MoviesList.as_view(), name='movies-list'),
+    url(r'^movies/bulk/$', MoviesBulkImport.as_view(), name='movies-bulk'),
+    url(r'^movies/facets/$', MovieFacets.as_view(), name='movie-facets'),
     url(r'^movies/(?P<pk>\d+)/$', MovieDetail.as_view(), name='movie-detail'),
     url(r'^comments/$', CommentsList.as_view(), name='comments-list'),
     url(r'^comments/(?P<pk>\d+)/$',
         CommentDetail.as_view(), name='comment-detail'),
     url(r'^top/$', TopList.as_view(), name='top'),
+    url(r'^stats/$', StatsView.as_view(), name='stats'),
+    url(r'^omdb/purge/$', OMDbPurgeView.as_view(), name='omdb-purge'),
     ]
@@ -1,26 +1,64 @@
+import calendar
 import datetime
-
-from django.db.models import Count, Q
+import hashlib
+import json
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (
+    Count, F, IntegerField, Max, OuterRef, Prefetch, Q, Subquery, Sum, Window
+)
+from django.db.models.functions import Coalesce, Rank, Upper
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
-import requests
 
-from movies.models import Comment, Movie
-from movies.pagination import CommentsLimitPagination, MoviesLimitPagination
+from movies import facets
+from movies import omdb
+from movies.cache import (
+    CachedRows, get_or_compute, get_or_respond, get_stats
+)
+from movies.filters import (
+    MovieFilterSet, MovieSearchFilter, RankedOrderingFilter
+)
+from movies.locks import import_lock
+from movies.models import (
+    Comment, CommentDailyCount, FacetCount, Movie, Rating
+)
+from movies.pagination import (
+    CommentsLimitPagination, MoviesLimitPagination, TopCursorPagination
+)
 from movies.permissions import IsAdminOrEditOnly
+from movies.renderers import FastJSONRenderer, dumps
+from movies.rows import RowMapper, url_builder
+from movies.signals import post_bulk_create
 from movies.serializers import (
+    BulkImportSerializer,
     CommentSerializer,
     MovieSerializer,
     MovieSerializerSave,
     TitleSerializer,
     TopSerializer,
 )
-from moviesapp.settings import OMDb_API_KEY, OMDb_URL
+from moviesapp.settings import (
+    COMMENTS_BULK_MAX_ITEMS, FACETS_CACHE_TIMEOUT,
+    OMDb_BULK_MAX_ITEMS, OMDb_BULK_WORKERS, RESPONSE_CACHE_TIMEOUT,
+    TOP_CACHE_TIMEOUT
+)
 
 
 class IndexView(APIView):
@@ -36,7 +74,258 @@ class IndexView(APIView):
         })
 
 
-class MoviesList(generics.ListCreateAPIView):
+# Hit and miss counters of cached data
+class StatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(data=get_stats())
+
+
+# Purge of cached OMDb answers made by the serving process - not found
+# movies and errors, also found movies if {"all": true} is posted
+class OMDbPurgeView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request):
+        omdb.get_client().purge(
+            negative=True, found=request.data.get('all') is True)
+        return Response(data={'Info': 'OMDb cache has been purged.'})
+
+
+# The latest of given times of changes, None values are skipped
+def latest(*times):
+    return max((time for time in times if time is not None), default=None)
+
+
+# Strong ETag and Last-Modified headers of GET responses - validator of the
+# response is computed with a cheap query (e.g. time of the last change and
+# number of rows), so unchanged resource is answered with 304 Not Modified
+# without fetching and serializing it
+class ConditionalGetMixin:
+    # If-Modified-Since is checked only if Last-Modified changes with every
+    # change of the response (deleted rows don't change it in lists)
+    use_last_modified = False
+
+    # Tuple of values which change whenever the response changes and the time
+    # of the last change, or None if resource can't be validated
+    def get_validator(self):
+        raise NotImplementedError
+
+    # Validator of lists - the last change and number of rows of whole
+    # tables, so also rows which no longer match filters change it. It is
+    # read from the database, so it is the same in every process.
+    @staticmethod
+    def get_tables_validator(*models):
+        state = [
+            model.objects.aggregate(updated=Max('updated'), total=Count('pk'))
+            for model in models
+        ]
+        return [(row['updated'], row['total']) for row in state], latest(
+            *(row['updated'] for row in state))
+
+    def get_etag(self, request, state):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        data = json.dumps(
+            [request.path, params, request.accepted_renderer.format, state],
+            cls=JSONEncoder,
+        )
+        return quote_etag(hashlib.sha1(data.encode('utf-8')).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        validator = self.get_validator()
+        if validator is None:
+            return super().get(request, *args, **kwargs)
+        state, last_modified = validator
+        # Cached response is valid only for the same state (see
+        # ResponseCacheMixin), so it matches its ETag in every process
+        self.validator_state = state
+        etag = self.get_etag(request, state)
+        timestamp = last_modified and calendar.timegm(
+            last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag,
+            last_modified=timestamp if self.use_last_modified else None,
+        )
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+# Opt-in cache of GET responses (enabled with RESPONSE_CACHE_TIMEOUT) - data
+# is cached until movies, ratings or comments change (see movies.signals)
+class ResponseCacheMixin:
+    response_cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    # Urls in data are absolute, so key contains host, query parameters
+    # (filters, ordering, page) are sorted and empty ones are skipped. State
+    # of conditional GET validator is a part of key, if it was computed.
+    def get_cache_key(self, request):
+        params = sorted(
+            (name, sorted(value for value in values if value))
+            for name, values in request.query_params.lists()
+            if any(values)
+        )
+        data = json.dumps([
+            request.build_absolute_uri(request.path), self.kwargs, params,
+            getattr(self, 'validator_state', None),
+        ], sort_keys=True, cls=JSONEncoder)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        if not self.response_cache_timeout:
+            return super().get(request, *args, **kwargs)
+        return get_or_respond(
+            'responses', self.get_cache_key(request),
+            lambda: super(ResponseCacheMixin, self).get(
+                request, *args, **kwargs),
+            self.response_cache_timeout,
+        )
+
+
+# Read-only fast path of lists - rows are fetched with values() and mapped to
+# the same data as serializer returns (see movies.rows), so serializer fields
+# aren't called for every row. JSON is rendered by orjson.
+class FastListMixin:
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    fast_serialization = True
+    # Serializer fields which aren't model columns, they are mapped by
+    # functions from get_row_mappers()
+    mapped_fields = ()
+
+    # Functions mapping rows of page to values of mapped fields
+    def get_row_mappers(self, fields, rows):
+        raise NotImplementedError
+
+    # Only fields selected with ?fields= and ?omit= are mapped
+    def get_row_mapper(self, model):
+        fields = self.get_serializer(many=True).child.fields
+        return RowMapper(model, fields, self.mapped_fields,
+                         getattr(self, 'field_columns', {}))
+
+    def map_rows(self, mapper, rows):
+        return mapper.map(rows, self.get_row_mappers(mapper.fields, rows))
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        mapper = self.get_row_mapper(queryset.model)
+        # Annotations are selected too, because rows can be ordered by them
+        # (e.g. by search rank)
+        rows = queryset.prefetch_related(None).values(*dict.fromkeys(
+            mapper.columns + list(queryset.query.annotations)))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.map_rows(mapper, page))
+        return Response(self.map_rows(mapper, list(rows)))
+
+
+# Only fields requested with ?fields= (or all fields except those from
+# ?omit=) are serialized and only columns required by them are fetched
+class SparseFieldsMixin:
+    # Columns required by serializer fields which aren't model fields
+    field_columns = {}
+
+    def get_fields_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return {field for field in value.split(',') if field}
+
+    def get_selected_fields(self):
+        if hasattr(self, '_selected_fields'):
+            return self._selected_fields
+        self._selected_fields = None
+        fields = self.get_fields_param('fields')
+        omit = self.get_fields_param('omit')
+        if self.request.method not in SAFE_METHODS or (
+                fields is None and omit is None):
+            return None
+
+        available = self.get_serializer_class().Meta.fields
+        unknown = ((fields or set()) | (omit or set())) - set(available)
+        if unknown:
+            raise ValidationError({'fields': 'Unknown fields: {}.'.format(
+                ', '.join(sorted(unknown)))})
+        self._selected_fields = [
+            field for field in available
+            if (fields is None or field in fields) and
+            field not in (omit or ())
+        ]
+        return self._selected_fields
+
+    def prune_columns(self, queryset):
+        selected = self.get_selected_fields()
+        if selected is None:
+            return queryset
+        model_fields = {
+            field.name for field in queryset.model._meta.concrete_fields
+        }
+        columns = {'pk'}
+        for field in selected:
+            if field in model_fields:
+                columns.add(field)
+            columns.update(self.field_columns.get(field, ()))
+        return queryset.only(*columns)
+
+    def get_queryset(self):
+        return self.prune_columns(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.get_selected_fields()
+        if selected is not None:
+            fields = getattr(serializer, 'child', serializer).fields
+            for field in set(fields) - set(selected):
+                fields.pop(field)
+        return serializer
+
+
+# Movies with ratings and number of comments fetched in constant number of
+# queries, IDs of comments are fetched only if requested (?expand=comments).
+# Related data is fetched only if its field is serialized.
+class MovieQuerysetMixin(SparseFieldsMixin):
+
+    def get_expand(self):
+        return set(self.request.query_params.get('expand', '').split(','))
+
+    def is_selected(self, field):
+        selected = self.get_selected_fields()
+        return selected is None or field in selected
+
+    def get_queryset(self):
+        queryset = Movie.objects.all()
+        if self.is_selected('Ratings'):
+            queryset = queryset.prefetch_related('Ratings')
+        if self.is_selected('comment_count'):
+            comments = Comment.objects.filter(movie=OuterRef('pk')).order_by(
+            ).values('movie').annotate(total=Count('pk')).values('total')
+            queryset = queryset.annotate(comment_count=Coalesce(
+                Subquery(comments, output_field=IntegerField()), 0))
+        if 'comments' in self.get_expand() and self.is_selected('comments'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'comments', queryset=Comment.objects.only(
+                    'pk', 'movie').order_by('pk'),
+            ))
+        return self.prune_columns(queryset)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
+
+class MoviesList(ConditionalGetMixin, ResponseCacheMixin, FastListMixin,
+                 MovieQuerysetMixin, generics.ListCreateAPIView):
     queryset = Movie.objects.all()
 
     # Override serializer_class in order to apply proper serializer
@@ -46,44 +335,70 @@ class MoviesList(generics.ListCreateAPIView):
         elif self.request.method == 'GET':
             return MovieSerializer
 
-    filter_backends = (DjangoFilterBackend, OrderingFilter)
-    filterset_fields = {
-        'Title': ('icontains', ),
-        'Year': ('exact', 'gt', 'lte'),
-        'Genre': ('icontains', ),
+    filter_backends = (
+        DjangoFilterBackend, MovieSearchFilter, RankedOrderingFilter)
+    filterset_class = MovieFilterSet
+    ordering_fields = ('Year', 'Title') + tuple(Movie.TYPED_FIELDS)
+    ordering_aliases = {
+        field: typed_field
+        for field, (typed_field, _) in Movie.TYPED_FIELDS.items()
     }
-    ordering_fields = ('Year', 'Title')
     ordering = 'pk'
     pagination_class = MoviesLimitPagination
+    mapped_fields = ('url', 'Ratings', 'comments_url', 'comments')
+
+    # Urls, ratings and IDs of comments of movies from the page, related
+    # rows are fetched with one query per relation
+    def get_row_mappers(self, fields, rows):
+        movie_url = url_builder('movies:movie-detail', self.request)
+        comments_url = '{}?movie='.format(
+            reverse('movies:comments-list', request=self.request))
+        pks = [row['id'] for row in rows]
+        ratings, comments = defaultdict(list), defaultdict(list)
+        if 'Ratings' in fields and pks:
+            for movie, source, value in Rating.objects.filter(
+                    Movie__in=pks).order_by('pk').values_list(
+                    'Movie', 'Source', 'Value'):
+                ratings[movie].append({'Source': source, 'Value': value})
+        if 'comments' in fields and pks:
+            for movie, comment in Comment.objects.filter(
+                    movie__in=pks).order_by('pk').values_list('movie', 'pk'):
+                comments[movie].append(comment)
+        return {
+            'url': lambda row: movie_url(row['id']),
+            'Ratings': lambda row: ratings.get(row['id'], []),
+            'comments_url': lambda row: comments_url + str(row['id']),
+            'comments': lambda row: comments.get(row['id'], []),
+        }
+
+    # Comments are counted in the list
+    def get_validator(self):
+        return self.get_tables_validator(Movie, Rating, Comment)
 
     # Get data the requested movie from the OMDb
     @staticmethod
     def omdb_requests(title):
-        url = (
-                OMDb_URL +
-                '?t={}&type=movie&apikey={}'.format(title, OMDb_API_KEY)
-        )
-        response = requests.get(url)
-        return response
+        return omdb.get_client().get_movie(title)
 
     # Function checks conditions and return proper values, if the movie doesn't
     # exists in DB serializes data from OMDb and saves model in DB
-    def serialize_data_omdb(self, data):
-        # Check if requested movie already exists in DB
-        if not Movie.objects.filter(Title=data['Title']).exists():
-            serializer = MovieSerializerSave(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                return {'data': serializer.data,
-                        'status': status.HTTP_201_CREATED}
-            else:
-                message = 'Problem with serializing data from OMDb.'
-                return {'data': {'Error': message},
-                        'status': status.HTTP_500_INTERNAL_SERVER_ERROR}
-        else:
+    @staticmethod
+    def serialize_data_omdb(data):
+        serializer = MovieSerializerSave(data=data)
+        if not serializer.is_valid():
+            message = 'Problem with serializing data from OMDb.'
+            return {'data': {'Error': message},
+                    'status': status.HTTP_500_INTERNAL_SERVER_ERROR}
+        # Movie is identified by unique imdbID - insert of the movie which
+        # already exists in DB is rejected by the index
+        try:
+            serializer.save()
+        except IntegrityError:
             message = '{} already exists in database.'.format(data['Title'])
             return {'data': {'Warning': message},
                     'status': status.HTTP_204_NO_CONTENT}
+        return {'data': serializer.data,
+                'status': status.HTTP_201_CREATED}
 
     def post(self, request):
         if request.data.get('Title'):
@@ -95,88 +410,387 @@ class MoviesList(generics.ListCreateAPIView):
             return Response(
                 data={'Error': message}, status=status.HTTP_400_BAD_REQUEST)
 
-        response = self.omdb_requests(title)
-        response_json = response.json()
+        # Only one request per title fetches the movie from OMDb and saves it,
+        # concurrent requests wait and use outcome of its import
+        with import_lock(omdb.normalize_title(title)) as lock:
+            response_params = None
+            if lock.outcome is not None:
+                response_params = self.find_imported(lock.outcome)
+            if response_params is None:
+                response_params = self.import_movie(title, lock)
+        return Response(data=response_params['data'],
+                        status=response_params['status'])
+
+    # Outcome of import made by concurrent request - imdbID of the movie (its
+    # title can differ from the requested one) or '' if it hasn't been found
+    @staticmethod
+    def find_imported(outcome):
+        if not outcome:
+            message = 'Movie with that title has not been found.'
+            return {'data': {'Error': message},
+                    'status': status.HTTP_204_NO_CONTENT}
+        saved_title = Movie.objects.filter(imdbID=outcome).values_list(
+            'Title', flat=True).first()
+        if saved_title is None:
+            return None
+        message = '{} already exists in database.'.format(saved_title)
+        return {'data': {'Warning': message},
+                'status': status.HTTP_204_NO_CONTENT}
+
+    def import_movie(self, title, lock):
+        saved_title = Movie.objects.filter(Title__iexact=title).values_list(
+            'Title', flat=True).first()
+        if saved_title is not None:
+            message = '{} already exists in database.'.format(saved_title)
+            return {'data': {'Warning': message},
+                    'status': status.HTTP_204_NO_CONTENT}
+
+        try:
+            response_json = self.omdb_requests(title)
+        except omdb.OMDbError:
+            message = 'OMDb is not available, please try again later.'
+            return {'data': {'Error': message},
+                    'status': status.HTTP_503_SERVICE_UNAVAILABLE}
 
-        if (response.status_code == requests.codes.ok and
-                response_json['Response'] == 'True'):
+        if response_json.get('Response') == 'True':
             response_params = self.serialize_data_omdb(response_json)
-            return Response(data=response_params['data'],
-                            status=response_params['status'])
+            # Outcome is recorded only when the movie has been saved (or it
+            # already exists), so waiting requests find it in DB
+            if response_params['status'] in (status.HTTP_201_CREATED,
+                                             status.HTTP_204_NO_CONTENT):
+                lock.record(response_json.get('imdbID', '').strip() or None)
+            return response_params
         else:
+            lock.record('')
             message = 'Movie with that title has not been found.'
-            return Response(data={'Error': message},
-                            status=status.HTTP_204_NO_CONTENT)
+            return {'data': {'Error': message},
+                    'status': status.HTTP_204_NO_CONTENT}
+
+
+# Import of many movies at once - data is fetched from OMDb concurrently and
+# new movies are saved in batches, every movie gets the same status as it
+# would get in MoviesList.post
+class MoviesBulkImport(APIView):
+    permission_classes = (IsAdminUser,)
+    batch_size = 50
+
+    @staticmethod
+    def fetch(item):
+        field, value = item
+        client = omdb.get_client()
+        try:
+            if field == 'imdbID':
+                return client.get_movie_by_id(value)
+            return client.get_movie(value)
+        except omdb.OMDbError:
+            return None
+
+    @staticmethod
+    def normalize(item):
+        field, value = item
+        if field == 'imdbID':
+            return field, value.strip().lower()
+        return field, omdb.normalize_title(value)
+
+    @staticmethod
+    def find_saved(items):
+        titles = [value.upper() for field, value in items if field == 'Title']
+        ids = [value.strip() for field, value in items if field == 'imdbID']
+        saved = {}
+        movies = Movie.objects.annotate(upper_title=Upper('Title')).filter(
+            Q(upper_title__in=titles) | Q(imdbID__in=ids)
+        ).values_list('Title', 'upper_title', 'imdbID')
+        for title, upper_title, imdb_id in movies:
+            saved[('Title', upper_title)] = title
+            saved[('imdbID', imdb_id)] = title
+        return saved
+
+    def post(self, request):
+        serializer = BulkImportSerializer(
+            data=request.data, context={'max_items': OMDb_BULK_MAX_ITEMS})
+        serializer.is_valid(raise_exception=True)
+        items = (
+            [('Title', title)
+             for title in serializer.validated_data.get('titles', [])] +
+            [('imdbID', imdb_id)
+             for imdb_id in serializer.validated_data.get('imdbIDs', [])]
+        )
+
+        # Movies already saved in DB are not requested from OMDb
+        saved = self.find_saved(items)
+        results = [None] * len(items)
+        to_fetch = []
+        for idx, (field, value) in enumerate(items):
+            key = (field, value.upper() if field == 'Title' else value.strip())
+            if key in saved:
+                message = '{} already exists in database.'.format(saved[key])
+                results[idx] = {'data': {'Warning': message},
+                                'status': status.HTTP_204_NO_CONTENT}
+            else:
+                to_fetch.append(idx)
+
+        # Every movie is requested from OMDb once, even if it's repeated
+        requested = OrderedDict()
+        for idx in to_fetch:
+            requested.setdefault(self.normalize(items[idx]), items[idx])
+        with ThreadPoolExecutor(max_workers=OMDb_BULK_WORKERS) as executor:
+            answers = dict(zip(
+                requested, executor.map(self.fetch, requested.values())))
+        fetched = [answers[self.normalize(items[idx])] for idx in to_fetch]
+
+        for start in range(0, len(to_fetch), self.batch_size):
+            with transaction.atomic():
+                for idx, data in zip(
+                        to_fetch[start:start + self.batch_size],
+                        fetched[start:start + self.batch_size]):
+                    results[idx] = self.import_data(data)
+
+        return Response(data=[
+            {field: value, 'status': result['status'], 'data': result['data']}
+            for (field, value), result in zip(items, results)
+        ])
+
+    @staticmethod
+    def import_data(data):
+        if data is None:
+            message = 'OMDb is not available, please try again later.'
+            return {'data': {'Error': message},
+                    'status': status.HTTP_503_SERVICE_UNAVAILABLE}
+        if data.get('Response') == 'True':
+            return MoviesList.serialize_data_omdb(data)
+        message = 'Movie with that title has not been found.'
+        return {'data': {'Error': message},
+                'status': status.HTTP_204_NO_CONTENT}
+
+
+# Number of movies per genre, year, decade and rating bucket, movies are
+# filtered in the same way as in MoviesList. Facets of all movies are read
+# from precomputed counts, facets of filtered movies are computed with one
+# grouped query per facet and cached for a while.
+class MovieFacets(generics.GenericAPIView):
+    queryset = Movie.objects.all()
+    filter_backends = (DjangoFilterBackend, MovieSearchFilter)
+    filterset_class = MovieFilterSet
+
+    def get(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not queryset.query.where:
+            counts = defaultdict(dict)
+            for facet, value, total in FacetCount.objects.values_list(
+                    'facet', 'value', 'count'):
+                counts[facet][value] = total
+            return Response(facets.serialize(counts))
+
+        params = json.dumps(sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        ))
+        data = get_or_compute(
+            'facets', hashlib.sha1(params.encode('utf-8')).hexdigest(),
+            lambda: facets.serialize(facets.count(
+                queryset, Movie.genres.through.objects.all())),
+            timeout=FACETS_CACHE_TIMEOUT,
+        )
+        return Response(data)
 
 
-class MovieDetail(generics.RetrieveDestroyAPIView):
+class MovieDetail(ConditionalGetMixin, ResponseCacheMixin,
+                  MovieQuerysetMixin, generics.RetrieveDestroyAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
     permission_classes = (IsAdminOrEditOnly,)
 
+    # The movie, its ratings and comments
+    def get_validator(self):
+        state = Movie.objects.filter(pk=self.kwargs['pk']).aggregate(
+            updated=Max('updated'),
+            ratings_updated=Max('Ratings__updated'),
+            ratings_total=Count('Ratings', distinct=True),
+            comments_updated=Max('comments__updated'),
+            comments_total=Count('comments', distinct=True),
+        )
+        if state['updated'] is None:
+            return None
+        return sorted(state.items()), latest(
+            state['updated'], state['ratings_updated'],
+            state['comments_updated'])
+
 
-class CommentsList(generics.ListCreateAPIView):
+class CommentsList(ConditionalGetMixin, FastListMixin, SparseFieldsMixin,
+                   generics.ListCreateAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    field_columns = {'movie_url': ('movie',)}
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_fields = ('movie', 'user')
     ordering_fields = ('movie', 'user', 'created')
     ordering = ('created', 'user')
     pagination_class = CommentsLimitPagination
-
-
-class CommentDetail(generics.RetrieveUpdateDestroyAPIView):
+    mapped_fields = ('url', 'movie_url')
+
+    def get_row_mappers(self, fields, rows):
+        comment_url = url_builder('movies:comment-detail', self.request)
+        movie_url = url_builder('movies:movie-detail', self.request)
+        return {
+            'url': lambda row: comment_url(row['id']),
+            'movie_url': lambda row: movie_url(row['movie']),
+        }
+
+    def get_validator(self):
+        return self.get_tables_validator(Comment)
+
+    # List of comments is created at once - every item is validated
+    # separately, valid ones are inserted with bulk_create() and every item
+    # gets its status, the same way as in MoviesBulkImport
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        items = request.data
+        if not items or len(items) > COMMENTS_BULK_MAX_ITEMS:
+            message = 'Please provide from 1 to {} comments.'.format(
+                COMMENTS_BULK_MAX_ITEMS)
+            return Response(data={'Error': message},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        context = self.get_serializer_context()
+        context['movie_ids'] = self.find_movies(items)
+        serializer_class = self.get_serializer_class()
+        results = [serializer_class(data=item, context=context)
+                   for item in items]
+        valid = [serializer for serializer in results
+                 if serializer.is_valid()]
+        comments = [Comment(**serializer.validated_data)
+                    for serializer in valid]
+        if comments:
+            with transaction.atomic():
+                Comment.objects.bulk_create(comments)
+                self.load_pks(comments)
+                post_bulk_create.send(sender=Comment, objects=comments)
+        for serializer, comment in zip(valid, comments):
+            serializer.instance = comment
+
+        return Response(data=[
+            {'status': status.HTTP_201_CREATED, 'data': serializer.data}
+            if serializer.instance is not None else
+            {'status': status.HTTP_400_BAD_REQUEST, 'data': serializer.errors}
+            for serializer in results
+        ])
+
+    # IDs of existing movies which comments are posted to, read with one query
+    @staticmethod
+    def find_movies(items):
+        pks = set()
+        for item in items:
+            try:
+                pks.add(int(item['movie']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not pks:
+            return set()
+        return set(Movie.objects.filter(pk__in=pks).values_list(
+            'pk', flat=True))
+
+    # Primary keys aren't set by bulk_create() on some backends. On SQLite
+    # rows inserted in the current transaction (which holds the write lock
+    # of the whole database) are the last ones, in order of the list. Other
+    # backends reload the rows matched by all their values - time of the
+    # change makes them unique.
+    @staticmethod
+    def load_pks(comments):
+        if comments[0].pk is not None:
+            return
+        if connection.vendor == 'sqlite':
+            pks = Comment.objects.order_by('-pk').values_list(
+                'pk', flat=True)[:len(comments)]
+            for comment, pk in zip(comments, reversed(list(pks))):
+                comment.pk = pk
+            return
+        fields = ('movie_id', 'user', 'comment', 'updated')
+        rows = Comment.objects.filter(reduce(or_, (
+            Q(**{field: getattr(comment, field) for field in fields})
+            for comment in comments
+        ))).order_by('pk').values_list('pk', *fields)
+        pks = defaultdict(list)
+        for pk, *values in rows:
+            pks[tuple(values)].append(pk)
+        for comment in comments:
+            comment.pk = pks[tuple(
+                getattr(comment, field) for field in fields)].pop(0)
+
+
+class CommentDetail(ConditionalGetMixin,
+                    generics.RetrieveUpdateDestroyAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = (IsAdminOrEditOnly,)
+    use_last_modified = True
+
+    def get_validator(self):
+        updated = Comment.objects.filter(pk=self.kwargs['pk']).values_list(
+            'updated', flat=True).first()
+        if updated is None:
+            return None
+        return (updated, ), updated
 
 
-class TopList(generics.ListAPIView):
+class TopList(ConditionalGetMixin, FastListMixin, generics.ListAPIView):
 
     serializer_class = TopSerializer
+    pagination_class = TopCursorPagination
+    mapped_fields = ('movie_url', )
 
     # Set default 'since' date as 2000-01-01,
     # assume before this date there isn't any comment
     # If in query params exists proper 'since' date value is override
     since = datetime.date(2000, 1, 1)
-    # If second query param 'to' is missing, date is set to today's
-    to = datetime.date.today()
-
-    def get_queryset(self, since=since, to=to):
-        top_movies = \
-            Movie.objects.annotate(
-                total_comments=Count('comments', filter=Q(
-                    comments__created__gt=since,
-                    comments__created__lte=to))).order_by('-total_comments')
-        data = []
-        # Create list with dictionary, every dictionary represent particular
-        # movie object with rank position
-        # {'movie': Movie(models), 'rank': rank_position(int)
-        for i in top_movies:
-            dictionary = {}
-            # Add 1 - in other case the ranking would have been started from 0
-            rank = top_movies.filter(
-                total_comments__gt=i.total_comments).count() + 1
-            dictionary['rank'] = rank
-            dictionary['movie'] = i
-            data.append(dictionary)
-
-        # Alternative approach - without hitting  DB
-        # Disadvantage = ranking depends on ordering queryset and doesn't
-        # work properly in ascending total_comments order
-        # TODO decide which method is better
-        # rank = 1
-        # for idx, i in enumerate(top_movies):
-        #     dictionary = {}
-        #     if idx > 0 and i.total_comments < top_movies[idx-1].total_comments:
-        #         rank = idx + 1
-        #         dictionary['rank'] = rank
-        #         dictionary['movie'] = i
-        #     else:
-        #         dictionary['rank'] = rank
-        #         dictionary['movie'] = i
-        #     data.append(dictionary)
-        return data
+
+    def get_queryset(self, since=since, to=None):
+        # If second query param 'to' is missing, date is set to today's
+        if to is None:
+            to = datetime.date.today()
+        # Comments are summed from daily counts in the requested date range,
+        # so the cost depends on the number of days rather than comments
+        daily_counts = CommentDailyCount.objects.filter(
+            movie=OuterRef('pk'), day__gt=since, day__lte=to,
+        ).order_by().values('movie').annotate(
+            total=Sum('count')).values('total')
+        # Rank is computed by the database with a RANK() window over the
+        # comments count, so movies with the same number of comments share
+        # the position and the next one skips the tied places (1, 2, 2, 4).
+        top_movies = Movie.objects.annotate(
+            total_comments=Coalesce(
+                Subquery(daily_counts, output_field=IntegerField()), 0),
+        ).annotate(
+            rank=Window(
+                expression=Rank(),
+                order_by=F('total_comments').desc(),
+            ),
+        ).order_by('rank', 'pk')
+        # Only values used in ranking are fetched, rows are dictionaries
+        # {'id': movie_id(int), 'total_comments': int, 'rank': int}
+        return top_movies.values('id', 'total_comments', 'rank')
+
+    def get_row_mappers(self, fields, rows):
+        movie_url = url_builder('movies:movie-detail', self.request)
+        return {'movie_url': lambda row: movie_url(row['id'])}
+
+    # Serialize ranking row by row, so the whole ranking is never kept in
+    # memory at once
+    def stream_ranking(self, top_movies):
+        yield b'['
+        if self.fast_serialization:
+            mapper = self.get_row_mapper(Movie)
+            to_data = mapper.compile(self.get_row_mappers(mapper.fields, ()))
+            for idx, row in enumerate(top_movies.iterator()):
+                yield (b',' if idx else b'') + dumps(to_data(row))
+        else:
+            context = self.get_serializer_context()
+            for idx, row in enumerate(top_movies.iterator()):
+                data = TopSerializer(row, context=context).data
+                yield (b',' if idx else b'') + json.dumps(
+                    data, cls=JSONEncoder, ensure_ascii=False,
+                    separators=(',', ':')).encode('utf-8')
+        yield b']'
 
     @staticmethod
     def check_date(filter_params, parameter):
@@ -193,33 +807,64 @@ class TopList(generics.ListAPIView):
         else:
             return date
 
-    def get(self, request):
-        to, since = self.to, self.since
+    # Date range of the ranking (since, to), or response params if a date has
+    # incorrect format
+    def get_date_range(self, filter_params):
+        to, since = datetime.date.today(), self.since
+
+        # Date range has been specified
+        if filter_params.get('since'):
+            since = self.check_date(filter_params, 'since')
+            if type(since) is not datetime.datetime:
+                return since
+
+        if filter_params.get('to'):
+            to = self.check_date(filter_params, 'to')
+            if type(to) is not datetime.datetime:
+                return to
+        return since, to
+
+    # Ranking changes with movies and comments, with daily counts (rebuilt
+    # counts are new rows) and with the normalized date range (the default
+    # end of range is today)
+    def get_validator(self):
+        date_range = self.get_date_range(self.request.query_params)
+        if isinstance(date_range, dict):
+            return None
+        state, last_modified = self.get_tables_validator(Movie, Comment)
+        counts = CommentDailyCount.objects.aggregate(last=Max('pk'))
+        return state + [counts['last']] + [
+            '{:%Y-%m-%d}'.format(date) for date in date_range
+        ], last_modified
+
+    def list(self, request, *args, **kwargs):
         filter_params = request.query_params
-        if filter_params:
-
-            # Date range has been specified
-            if filter_params.get('since'):
-                since = self.check_date(filter_params, 'since')
-                if type(since) is not datetime.datetime:
-                    return Response(data=since['data'], status=since['status'])
-
-            if filter_params.get('to'):
-                to = self.check_date(filter_params, 'to')
-                if type(to) is not datetime.datetime:
-                    return Response(data=to['data'], status=to['status'])
-
-            data = self.get_queryset(since, to)
-            serializer = TopSerializer(
-                data, many=True, context={'request': request}
-            )
-            return Response(serializer.data)
-
-        # Date range hasn't been specified
-        else:
-            data = self.get_queryset()
-            serializer = TopSerializer(
-                data, many=True, context={'request': request}
-            )
-            return Response(serializer.data)
+        date_range = self.get_date_range(filter_params)
+        if isinstance(date_range, dict):
+            return Response(data=date_range['data'],
+                            status=date_range['status'])
+        since, to = date_range
+
+        # Ranking is cached until comments or movies change, key contains
+        # normalized date range
+        top_movies = CachedRows(
+            self.get_queryset(since, to), 'top',
+            '{:%Y-%m-%d}:{:%Y-%m-%d}'.format(since, to),
+            timeout=TOP_CACHE_TIMEOUT,
+        )
 
+        # Page of ranking has been requested
+        if {'limit', 'cursor'} & filter_params.keys():
+            page = self.paginate_queryset(top_movies)
+            if self.fast_serialization:
+                data = self.map_rows(self.get_row_mapper(Movie), page)
+            else:
+                data = TopSerializer(
+                    page, many=True, context={'request': request}
+                ).data
+            return self.get_paginated_response(data)
+
+        # Whole ranking is streamed
+        return StreamingHttpResponse(
+            self.stream_ranking(top_movies), content_type='application/json'
+        )
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Compresses responses with brotli or gzip
+    'movies.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +92,21 @@ DATABASES = {
     }
 }
 
+# Cache of rankings, counts and responses - local memory by default, file
+# based or Redis-compatible backend can be set with CACHE_BACKEND and
+# CACHE_LOCATION. Memory is bounded by backend's eviction (MAX_ENTRIES of
+# local memory and file caches, maxmemory policy of Redis).
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
 
 
 # Password validation
@@ -133,6 +150,43 @@ STATIC_URL = '/static/'
 # OMDb parameters
 OMDb_API_KEY = os.environ.get('MY_API_KEY')
 OMDb_URL = 'http://www.omdbapi.com/'
+# Connect and read timeouts in seconds
+OMDb_TIMEOUT = (3.05, 10)
+# Failed requests are repeated with delays growing from OMDb_BACKOFF_FACTOR
+OMDb_RETRIES = 2
+OMDb_BACKOFF_FACTOR = 0.5
+OMDb_POOL_SIZE = 10
+# Found movies are cached by title, timeout in seconds
+OMDb_CACHE_SIZE = 1000
+OMDb_CACHE_TTL = 60 * 60 * 24
+# Not found movies and error answers are cached separately for shorter time
+OMDb_NEGATIVE_CACHE_TTL = 60 * 10
+# Bulk import - maximum number of movies in request and concurrent requests
+OMDb_BULK_MAX_ITEMS = 500
+OMDb_BULK_WORKERS = 8
+# Lease of import lock of a title in seconds - it covers OMDb request with
+# retries, outcome of the import is kept for the same time
+IMPORT_LOCK_TIMEOUT = 60
+# Maximum number of comments created with one request
+COMMENTS_BULK_MAX_ITEMS = 500
+# Directory of on-disk cache which survives restarts, disabled if not set
+OMDb_CACHE_DIR = os.environ.get('OMDB_CACHE_DIR')
+
+# Ranking of top commented movies is cached until comments or movies change,
+# timeout in seconds
+TOP_CACHE_TIMEOUT = 60 * 60
+
+# Total number of movies and comments in paginated lists is cached until rows
+# are added or removed, timeout in seconds
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+# Facets of filtered movies are cached for a short time (in seconds), they
+# are also invalidated when movies change
+FACETS_CACHE_TIMEOUT = 60
+
+# Responses of list and detail of movies are cached until movies, ratings or
+# comments change, timeout in seconds - disabled if not set
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 0))
 
 
 REST_FRAMEWORK = {